@@ -0,0 +1,89 @@
+"""Whole-file regex parse vs the streaming block extractor, sequential and
+split across worker processes: blocks/s and peak RSS on a synthetic
+block-format file, each mode in a fresh process.
+
+    python -m bench.bench_blocks --blocks 1000000 --workers 2 4
+"""
+import argparse
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from bench.bench_pipeline import NullStore
+from etl.config.settings import settings
+from etl.phases import block_format
+from etl.phases.extract import Position, extract_blocks
+
+MODES = ("whole-file", "stream", "parallel")
+
+
+def synthetic_blocks(path, n):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("1 synthetic block file\n*generated for bench_blocks\n")
+        for i in range(n):
+            f.write(f"{i}\tblock {i}\n*header {i}\n")
+            for j in range(i % 5 + 1):
+                f.write(f"\tcontent line {j} of block {i}\n")
+            f.write("0\n*\n")
+
+
+def whole_file(path):
+    # what etl/regex.py did: read everything, then one finditer
+    data = Path(path).read_bytes()
+    start = block_format.preamble_end(data)
+    return sum(1 for _ in block_format.parse(data, start))
+
+
+def stream(path):
+    batches = extract_blocks("bench", path, NullStore(), Position())
+    return sum(len(batch) for batch in batches)
+
+
+def run(mode, path, workers):
+    settings.extract_workers = workers
+    started = time.perf_counter()
+    blocks = whole_file(path) if mode == "whole-file" else stream(path)
+    elapsed = time.perf_counter() - started
+    # ru_maxrss is in KiB on Linux; workers report their own peak
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    label = f"workers={workers}" if mode == "parallel" else mode
+    print(
+        f"{label:>10}: {elapsed:8.2f}s {blocks / elapsed:12,.0f} blocks/s "
+        f"peak {peak:8.1f} MiB (worker {children:.1f} MiB)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--blocks", type=int, default=1_000_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[2])
+    parser.add_argument("--mode", choices=MODES)
+    parser.add_argument("--path")
+    args = parser.parse_args()
+
+    if args.mode:
+        run(args.mode, args.path, args.workers[0])
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "blocks.txt"
+        synthetic_blocks(path, args.blocks)
+        size = path.stat().st_size / 1024**2
+        print(f"blocks={args.blocks} size={size:.1f} MiB")
+        runs = [("whole-file", 1), ("stream", 1)]
+        runs += [("parallel", workers) for workers in args.workers]
+        for mode, workers in runs:
+            # peak RSS only ever grows, so every mode needs a process of its own
+            subprocess.run(
+                [sys.executable, "-m", "bench.bench_blocks"]
+                + ["--mode", mode, "--path", str(path), "--workers", str(workers)],
+                check=True,
+            )
+
+
+if __name__ == "__main__":
+    main()
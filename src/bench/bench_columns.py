@@ -0,0 +1,70 @@
+"""Row tuples vs columnar batches from transform into a COPY buffer,
+without a database: rows/s and peak RSS, each mode in a fresh process.
+
+    python -m bench.bench_columns --rows 1000000 --chunk-rows 100000
+"""
+import argparse
+import resource
+import subprocess
+import sys
+import time
+
+from bench.bench_transform import synthetic_batches
+from etl.config.settings import settings
+from etl.phases.dedup import dedup
+from etl.phases.load import _copy_buffer
+from etl.phases.transform import transform_batches
+
+MODES = ("rows", "columns")
+
+
+def run(mode, rows, chunk_rows):
+    batches = synthetic_batches(rows, settings.batch_lines)
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    started = time.perf_counter()
+    buffer = None
+    copied = 0
+    for batch in transform_batches(batches, columnar=mode == "columns"):
+        if buffer is None:
+            buffer = batch.copy()
+        else:
+            buffer.extend(batch)
+        if len(buffer) >= chunk_rows:
+            copied += len(_copy_buffer(dedup(buffer)[0]).getvalue())
+            buffer = None
+    if buffer:
+        copied += len(_copy_buffer(dedup(buffer)[0]).getvalue())
+    elapsed = time.perf_counter() - started
+
+    # ru_maxrss is in KiB on Linux; the input lines are in both baselines
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline
+    print(
+        f"{mode:>8}: {elapsed:8.2f}s {rows / elapsed:12,.0f} rows/s "
+        f"peak +{peak / 1024:8.1f} MiB  copy {copied / 1024**2:8.1f} MiB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--chunk-rows", type=int, default=100_000)
+    parser.add_argument("--mode", choices=MODES)
+    args = parser.parse_args()
+
+    if args.mode:
+        run(args.mode, args.rows, args.chunk_rows)
+        return
+
+    print(f"rows={args.rows} chunk_rows={args.chunk_rows}")
+    for mode in MODES:
+        # peak RSS only ever grows, so every mode needs a process of its own
+        subprocess.run(
+            [sys.executable, "-m", "bench.bench_columns", "--mode", mode]
+            + ["--rows", str(args.rows), "--chunk-rows", str(args.chunk_rows)],
+            check=True,
+        )
+
+
+if __name__ == "__main__":
+    main()
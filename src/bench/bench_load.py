@@ -0,0 +1,70 @@
+"""Compare load modes against the database configured via ETL_DATABASE_URL.
+
+    python -m bench.bench_load --rows 200000 --modes insert copy
+"""
+import argparse
+import time
+
+from sqlalchemy import text
+
+from etl.config.settings import settings
+from etl.db.database import Session
+from etl.metadata.checkpoint_store import CheckpointStore
+from etl.phases import load as load_phase
+from etl.phases.extract import Position
+from etl.phases.records import CustomerRecord
+
+
+def synthetic_rows(n, offset=0):
+    for i in range(offset, offset + n):
+        yield CustomerRecord(
+            f"bench-{i:012d}",
+            f"Customer {i}",
+            f"customer{i}@example.com",
+            "2026-01-01T00:00:00",
+        )
+
+
+def bench(mode, n, session, store):
+    run_id = f"bench-{mode}-{int(time.time())}"
+    settings.load_mode = mode
+
+    started = time.perf_counter()
+    load_phase.load(run_id, synthetic_rows(n), session, store, Position())
+    elapsed = time.perf_counter() - started
+
+    session.execute(
+        text("DELETE FROM etl_checkpoint WHERE run_id = :run_id"), {"run_id": run_id}
+    )
+    session.commit()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--modes", nargs="+", default=sorted(load_phase.FLUSHERS))
+    args = parser.parse_args()
+
+    session = Session()
+    store = CheckpointStore(session)
+    try:
+        print(f"rows={args.rows} chunk_size={settings.chunk_size}")
+        for mode in args.modes:
+            # first pass inserts, second pass hits ON CONFLICT for every row
+            for label in ("insert", "upsert"):
+                elapsed = bench(mode, args.rows, session, store)
+                print(
+                    f"{mode:>8} {label:>7}: {elapsed:8.2f}s "
+                    f"{args.rows / elapsed:12,.0f} rows/s"
+                )
+            session.execute(
+                text("DELETE FROM customer WHERE external_id LIKE 'bench-%'")
+            )
+            session.commit()
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Compare the compiled field-mapping spec with the hand-written transform.
+
+    python -m bench.bench_mapping --rows 1000000 --repeat 5
+"""
+import argparse
+import time
+
+from bench.bench_transform import synthetic_batches
+from etl.config.settings import settings
+from etl.phases.decoders import decoder
+from etl.phases.mapping import compile_spec
+from etl.phases.records import CustomerRecord
+from etl.pipelines.customers import SPEC
+
+
+def hand_written(lines, loads):
+    return [
+        CustomerRecord(
+            raw["id"], raw["name"].strip(), raw["email"].lower(), raw["updated_at"]
+        )
+        for raw in map(loads, lines)
+    ]
+
+
+def bench(batches, batch, loads):
+    started = time.perf_counter()
+    rows = sum(len(batch(lines, loads)) for lines in batches)
+    return rows, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    batches = synthetic_batches(args.rows, settings.batch_lines)
+    loads = decoder(settings.json_decoder)
+    compiled = compile_spec(SPEC)
+    assert hand_written(batches[0], loads) == compiled(batches[0], loads)
+
+    print(f"rows={args.rows} decoder={settings.json_decoder}")
+    print(compiled.source)
+    for label, batch in [("hand-written", hand_written), ("compiled", compiled)]:
+        # best of several runs, to keep noise from the first pass out
+        rows, elapsed = min(
+            (bench(batches, batch, loads) for _ in range(args.repeat)),
+            key=lambda run: run[1],
+        )
+        print(f"{label:>12}: {elapsed:8.2f}s {rows / elapsed:12,.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
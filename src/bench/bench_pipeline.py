@@ -0,0 +1,77 @@
+"""Compare per-line and batched extract + transform, without a database.
+
+    python -m bench.bench_pipeline --rows 1000000 --batch-lines 100 1000 10000
+"""
+import argparse
+import json
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+from etl.phases.extract import Position, extract, extract_batches
+from etl.phases.transform import transform, transform_batches
+
+
+class NullStore:
+    """Checkpoint store that remembers nothing."""
+
+    def get(self, run_id, phase):
+        return None
+
+    def set(self, run_id, phase, cursor):
+        pass
+
+    def stage(self, run_id, phase, cursor):
+        pass
+
+
+def synthetic_zip(path, n):
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        with zf.open("customers.ndjson", "w") as f:
+            for i in range(n):
+                line = {
+                    "id": f"bench-{i:012d}",
+                    "name": f"  Customer {i} ",
+                    "email": f"Customer{i}@Example.com",
+                    "updated_at": "2026-01-01T00:00:00",
+                }
+                f.write(json.dumps(line).encode() + b"\n")
+
+
+def per_line(path):
+    rows = 0
+    for _ in transform(extract("bench", path, NullStore(), Position())):
+        rows += 1
+    return rows
+
+
+def batched(path, batch_lines):
+    batches = extract_batches("bench", path, NullStore(), Position(), batch_lines)
+    return sum(len(batch) for batch in transform_batches(batches))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--batch-lines", type=int, nargs="+", default=[1000])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.zip"
+        synthetic_zip(path, args.rows)
+
+        runs = [("per-line", lambda: per_line(path))]
+        for size in args.batch_lines:
+            runs.append((f"batch={size}", lambda size=size: batched(path, size)))
+
+        print(f"rows={args.rows}")
+        for label, run in runs:
+            started = time.perf_counter()
+            rows = run()
+            elapsed = time.perf_counter() - started
+            print(f"{label:>12}: {elapsed:8.2f}s {rows / elapsed:12,.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
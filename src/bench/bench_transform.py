@@ -0,0 +1,68 @@
+"""Scaling of the multiprocess transform from one worker up to N.
+
+    python -m bench.bench_transform --rows 2000000 --workers 1 2 4 8
+"""
+import argparse
+import json
+import os
+import time
+
+from etl.config.settings import settings
+from etl.phases.extract import Position
+from etl.phases.transform import transform_batches, transform_parallel
+
+
+def synthetic_batches(n, batch_lines):
+    lines = [
+        json.dumps(
+            {
+                "id": f"bench-{i:012d}",
+                "name": f"  Customer {i} ",
+                "email": f"Customer{i}@Example.com",
+                "updated_at": "2026-01-01T00:00:00",
+            }
+        ).encode()
+        for i in range(n)
+    ]
+    return [lines[i : i + batch_lines] for i in range(0, n, batch_lines)]
+
+
+def bench(batches, workers):
+    position = Position()
+
+    def source():
+        for batch in batches:
+            position.rows += len(batch)
+            yield batch
+
+    started = time.perf_counter()
+    if workers == 0:
+        out = transform_batches(source())
+    else:
+        out = transform_parallel(source(), position, Position(), workers)
+    rows = sum(len(batch) for batch in out)
+    return rows, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument(
+        "--workers", type=int, nargs="+", default=[1, 2, os.cpu_count() or 1]
+    )
+    args = parser.parse_args()
+
+    print(
+        f"rows={args.rows} batch_lines={settings.batch_lines} "
+        f"task_lines={settings.transform_task_lines} cpus={os.cpu_count()}"
+    )
+    batches = synthetic_batches(args.rows, settings.batch_lines)
+    # 0 is the in-process baseline
+    for workers in [0] + args.workers:
+        n, elapsed = bench(batches, workers)
+        label = "in-process" if workers == 0 else f"workers={workers}"
+        print(f"{label:>12}: {elapsed:8.2f}s {n / elapsed:12,.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Micro-benchmark of a single chunk flush, per load mode.
+
+Every flush runs inside a transaction that is rolled back, so the target
+table is left as it was. The row count is deliberately not a multiple of
+the chunk size so the short final chunk is part of the measurement.
+
+    python -m bench.bench_upsert --rows 50000 --chunk 1000 --modes insert values
+"""
+import argparse
+import time
+
+from etl.db.database import Session
+from etl.phases import load as load_phase
+from bench.bench_load import synthetic_rows
+
+
+def bench(mode, rows, chunk, session):
+    flush = load_phase.FLUSHERS[mode]
+    chunks = [rows[i : i + chunk] for i in range(0, len(rows), chunk)]
+
+    started = time.perf_counter()
+    for c in chunks:
+        flush(c, session)
+    elapsed = time.perf_counter() - started
+
+    session.rollback()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--chunk", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--modes", nargs="+", default=["insert", "values"])
+    args = parser.parse_args()
+
+    rows = list(synthetic_rows(args.rows + args.chunk // 3))
+    session = Session()
+    try:
+        print(f"rows={len(rows)} chunk={args.chunk}")
+        for mode in args.modes:
+            best = min(
+                bench(mode, rows, args.chunk, session) for _ in range(args.repeat)
+            )
+            print(f"{mode:>8}: {best:8.3f}s {len(rows) / best:12,.0f} rows/s")
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""etl_run row counts
+
+Revision ID: 8f41d06c2e95
+Revises: 3b9e2c41a7d0
+Create Date: 2026-10-17 11:02:17.884310
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8f41d06c2e95'
+down_revision: Union[str, Sequence[str], None] = '3b9e2c41a7d0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('etl_run', sa.Column('rows_inserted', sa.BigInteger(), nullable=True))
+    op.add_column('etl_run', sa.Column('rows_updated', sa.BigInteger(), nullable=True))
+    op.add_column('etl_run', sa.Column('rows_skipped', sa.BigInteger(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('etl_run', 'rows_skipped')
+    op.drop_column('etl_run', 'rows_updated')
+    op.drop_column('etl_run', 'rows_inserted')
@@ -0,0 +1,28 @@
+"""etl_run duplicate count
+
+Revision ID: c5d7a9e13f26
+Revises: 8f41d06c2e95
+Create Date: 2026-10-17 12:26:03.101947
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5d7a9e13f26'
+down_revision: Union[str, Sequence[str], None] = '8f41d06c2e95'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('etl_run', sa.Column('rows_duplicate', sa.BigInteger(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('etl_run', 'rows_duplicate')
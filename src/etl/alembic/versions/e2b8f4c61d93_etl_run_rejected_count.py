@@ -0,0 +1,28 @@
+"""etl_run rejected count
+
+Revision ID: e2b8f4c61d93
+Revises: c5d7a9e13f26
+Create Date: 2026-10-17 21:14:38.552190
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2b8f4c61d93'
+down_revision: Union[str, Sequence[str], None] = 'c5d7a9e13f26'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('etl_run', sa.Column('rows_rejected', sa.BigInteger(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('etl_run', 'rows_rejected')
@@ -21,6 +21,43 @@ class Settings(BaseSettings):
     temp_dir: Path
     chunk_size: int
     request_timeout: Optional[int] = None
+    source_url: str = "https://example.com/data.zip"
+    # YAML list of sources; replaces source_url when set
+    source_manifest: Optional[Path] = None
+    download_workers: int = 4
+    download_per_host: int = 2
+    download_retries: int = 5
+    download_backoff: float = 1.0
+    download_segments: int = 4
+    download_cache: bool = True
+    download_cache_bytes: int = 50 * 1024**3
+    ingest_mode: str = "archive"  # archive | stream
+    # lines per batch handed from extract through transform to load
+    batch_lines: int = 1000
+    json_decoder: str = "auto"  # auto | orjson | msgspec | json
+    # >1 transforms in that many processes, in tasks of transform_task_lines
+    transform_workers: int = 1
+    transform_task_lines: int = 10_000
+    # hand rows to load as one list per field instead of one tuple per row
+    columnar_batches: bool = False
+    # >1 decompresses zip members, or parses a plain block file, in that
+    # many processes
+    extract_workers: int = 1
+    load_mode: str = "insert"  # insert | copy | values
+    values_page_size: int = 1000
+    load_workers: int = 1
+    upsert_mode: str = "always"  # always | changed
+    # bad rows set aside in <run_id>.rejects.ndjson before the run fails;
+    # 0 fails on the first one
+    max_rejects: int = 0
+    # group commit budget; 0/0 commits after every chunk
+    commit_rows: int = 0
+    commit_bytes: int = 0
+    # adaptive chunk sizing; chunk_size is the starting point
+    adaptive_chunks: bool = False
+    chunk_target_seconds: float = 1.0
+    chunk_min: int = 100
+    chunk_max: int = 100_000
 
     class Config:
         env_prefix = "ETL_"
@@ -45,11 +82,81 @@ class Settings(BaseSettings):
         timeout = os.environ.get(key("REQUEST_TIMEOUT")) or 30
         request_timeout = int(timeout) if timeout is not None else cls.request_timeout
 
+        source_url = (
+            os.environ.get(key("SOURCE_URL")) or "https://example.com/data.zip"
+        )
+        manifest = os.environ.get(key("SOURCE_MANIFEST"))
+        source_manifest = Path(manifest) if manifest else None
+        download_workers = int(os.environ.get(key("DOWNLOAD_WORKERS")) or 4)
+        download_per_host = int(os.environ.get(key("DOWNLOAD_PER_HOST")) or 2)
+        download_retries = int(os.environ.get(key("DOWNLOAD_RETRIES")) or 5)
+        download_backoff = float(os.environ.get(key("DOWNLOAD_BACKOFF")) or 1.0)
+        download_segments = int(os.environ.get(key("DOWNLOAD_SEGMENTS")) or 4)
+        cache = os.environ.get(key("DOWNLOAD_CACHE")) or "true"
+        download_cache = cache.lower() in ("1", "true", "yes")
+        download_cache_bytes = int(
+            os.environ.get(key("DOWNLOAD_CACHE_BYTES")) or 50 * 1024**3
+        )
+        ingest_mode = os.environ.get(key("INGEST_MODE")) or "archive"
+        batch_lines = int(os.environ.get(key("BATCH_LINES")) or 1000)
+        json_decoder = os.environ.get(key("JSON_DECODER")) or "auto"
+        transform_workers = int(os.environ.get(key("TRANSFORM_WORKERS")) or 1)
+        transform_task_lines = int(
+            os.environ.get(key("TRANSFORM_TASK_LINES")) or 10_000
+        )
+        columnar = os.environ.get(key("COLUMNAR_BATCHES")) or ""
+        columnar_batches = columnar.lower() in ("1", "true", "yes")
+
+        extract_workers = int(os.environ.get(key("EXTRACT_WORKERS")) or 1)
+
+        load_mode = os.environ.get(key("LOAD_MODE")) or "insert"
+        values_page_size = int(os.environ.get(key("VALUES_PAGE_SIZE")) or 1000)
+        load_workers = int(os.environ.get(key("LOAD_WORKERS")) or 1)
+        upsert_mode = os.environ.get(key("UPSERT_MODE")) or "always"
+        max_rejects = int(os.environ.get(key("MAX_REJECTS")) or 0)
+        commit_rows = int(os.environ.get(key("COMMIT_ROWS")) or 0)
+        commit_bytes = int(os.environ.get(key("COMMIT_BYTES")) or 0)
+
+        adaptive = os.environ.get(key("ADAPTIVE_CHUNKS")) or ""
+        adaptive_chunks = adaptive.lower() in ("1", "true", "yes")
+        chunk_target_seconds = float(
+            os.environ.get(key("CHUNK_TARGET_SECONDS")) or 1.0
+        )
+        chunk_min = int(os.environ.get(key("CHUNK_MIN")) or 100)
+        chunk_max = int(os.environ.get(key("CHUNK_MAX")) or 100_000)
+
         return cls(
             database_url=db,
             temp_dir=temp_dir,
             chunk_size=chunk_size,
             request_timeout=request_timeout,
+            source_url=source_url,
+            source_manifest=source_manifest,
+            download_workers=download_workers,
+            download_per_host=download_per_host,
+            download_retries=download_retries,
+            download_backoff=download_backoff,
+            download_segments=download_segments,
+            download_cache=download_cache,
+            download_cache_bytes=download_cache_bytes,
+            ingest_mode=ingest_mode,
+            batch_lines=batch_lines,
+            json_decoder=json_decoder,
+            transform_workers=transform_workers,
+            transform_task_lines=transform_task_lines,
+            columnar_batches=columnar_batches,
+            extract_workers=extract_workers,
+            load_mode=load_mode,
+            values_page_size=values_page_size,
+            load_workers=load_workers,
+            upsert_mode=upsert_mode,
+            max_rejects=max_rejects,
+            commit_rows=commit_rows,
+            commit_bytes=commit_bytes,
+            adaptive_chunks=adaptive_chunks,
+            chunk_target_seconds=chunk_target_seconds,
+            chunk_min=chunk_min,
+            chunk_max=chunk_max,
         )
 
 
@@ -57,7 +164,11 @@ class Settings2:
     """Load configuration from multiple sources"""
 
     def __init__(self):
-        self.config_path = Path(__file__).parent / "databases.yaml"
+        # ETL_DATABASES_YAML points at a copy kept elsewhere
+        path = os.environ.get("ETL_DATABASES_YAML")
+        self.config_path = (
+            Path(path) if path else Path(__file__).parent / "databases.yaml"
+        )
         self._load_yaml()
         self._load_secrets()
 
@@ -4,5 +4,10 @@ CREATE TABLE etl_run (
     current_phase   TEXT NOT NULL, -- DOWNLOAD | EXTRACT | TRANSFORM | LOAD
     created_at      TIMESTAMPTZ NOT NULL DEFAULT now(),
     updated_at      TIMESTAMPTZ NOT NULL DEFAULT now(),
-    error_message   TEXT
+    error_message   TEXT,
+    rows_inserted   BIGINT,
+    rows_updated    BIGINT,
+    rows_skipped    BIGINT, -- unchanged rows left untouched by the upsert
+    rows_duplicate  BIGINT, -- repeated external_ids collapsed within a chunk
+    rows_rejected   BIGINT  -- bad rows quarantined instead of failing the run
 );
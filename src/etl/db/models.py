@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, DateTime, Text
+from sqlalchemy import Column, String, Integer, BigInteger, DateTime, Text
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.sql import func
 
@@ -12,6 +12,11 @@ class EtlRun(Base):
     status = Column(String, nullable=False)
     current_phase = Column(String, nullable=False)
     error_message = Column(Text)
+    rows_inserted = Column(BigInteger)
+    rows_updated = Column(BigInteger)
+    rows_skipped = Column(BigInteger)
+    rows_duplicate = Column(BigInteger)
+    rows_rejected = Column(BigInteger)
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
@@ -23,3 +28,13 @@ class EtlCheckpoint(Base):
     phase = Column(String, primary_key=True)
     cursor = Column(String, nullable=False)
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
+class Customer(Base):
+    __tablename__ = "customer"
+
+    id = Column(Integer, primary_key=True)
+    external_id = Column(String, nullable=False, unique=True)
+    name = Column(String)
+    email = Column(String)
+    updated_at = Column(DateTime)
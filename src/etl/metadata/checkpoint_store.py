@@ -19,6 +19,15 @@ class CheckpointStore:
         return row[0] if row else None
 
     def set(self, run_id: str, phase: str, cursor: str):
+        self.stage(run_id, phase, cursor)
+        self.session.commit()
+
+    def stage(self, run_id: str, phase: str, cursor: str):
+        """Write the cursor inside the session's current transaction.
+
+        The cursor becomes durable together with whatever else the caller
+        commits, e.g. the chunk of rows it describes.
+        """
         self.session.execute(
             text(
                 """
@@ -30,4 +39,3 @@ class CheckpointStore:
             ),
             {"run_id": run_id, "phase": phase, "cursor": cursor},
         )
-        self.session.commit()
@@ -47,3 +47,33 @@ class RunStore:
             {"run_id": run_id},
         )
         self.session.commit()
+
+    def set_counts(
+        self,
+        run_id: str,
+        inserted: int,
+        updated: int,
+        skipped: int,
+        duplicate: int = 0,
+        rejected: int = 0,
+    ):
+        self.session.execute(
+            text("""
+            UPDATE etl_run
+            SET rows_inserted = :inserted,
+                rows_updated = :updated,
+                rows_skipped = :skipped,
+                rows_duplicate = :duplicate,
+                rows_rejected = :rejected
+            WHERE run_id = :run_id
+            """),
+            {
+                "run_id": run_id,
+                "inserted": inserted,
+                "updated": updated,
+                "skipped": skipped,
+                "duplicate": duplicate,
+                "rejected": rejected,
+            },
+        )
+        self.session.commit()
@@ -0,0 +1,108 @@
+import re
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+# The block format: an optional preamble (a numbered file line and "*"
+# comment lines), then blocks of a numbered top line, a "*" header line and
+# one or more tab-indented content lines, each block closed by a sentinel
+# "0" line and "*" line. Anything between blocks is skipped.
+PREAMBLE = re.compile(
+    rb"\A(?P<fileline>\d+[^\S\r\n]+[^\r\n]+)\r?\n(?:\*[^\r\n]*\r?\n)*"
+)
+BLOCK = re.compile(
+    rb"(?m)^(?P<top>\d+\t[^\r\n]*)\r?\n"
+    rb"(?P<header>\*[^\r\n]*)\r?\n"
+    rb"(?P<content>(?:\t[^\r\n]*\r?\n)+)"
+    rb"0\r?\n\*\r?\n"
+)
+
+# the sentinel as it appears after a preceding line; no block can span one
+SENTINELS = (b"\n0\n*\n", b"\n0\r\n*\n", b"\n0\n*\r\n", b"\n0\r\n*\r\n")
+SENTINEL = re.compile(rb"\n0\r?\n\*\r?\n")
+_SENTINEL_MAX = max(map(len, SENTINELS))
+
+
+class Block(NamedTuple):
+    """One block, as text: its numbered top line, its ``*`` header line and
+    its content lines without their leading tab."""
+
+    top: str
+    header: str
+    lines: List[str]
+
+
+def preamble_end(data) -> int:
+    """Where the blocks of a file starting with ``data`` begin: past the
+    preamble, if it has one."""
+    m = PREAMBLE.match(data)
+    return m.end() if m else 0
+
+
+def parse(
+    data, start: int = 0, end: Optional[int] = None
+) -> Iterator[Tuple[Block, int]]:
+    """Yield ``(block, offset)`` for every block in ``data[start:end]``,
+    ``offset`` being just past the block's sentinel. ``data`` is any bytes
+    buffer, a mapping included."""
+    if end is None:
+        end = len(data)
+    for m in BLOCK.finditer(data, start, end):
+        top, header, content = m.group("top", "header", "content")
+        # line ends are the only place a CR can be
+        lines = content.replace(b"\r", b"").decode("utf-8").split("\n")
+        lines.pop()
+        yield Block(
+            top.decode("utf-8"), header.decode("utf-8"), [ln[1:] for ln in lines]
+        ), m.end()
+
+
+def regions(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Re-cut byte chunks into regions that each end just past a sentinel,
+    the last one at the end of input, so that no block straddles two of
+    them and each region parses on its own exactly as it would in place.
+    Only a partial region is carried from one chunk to the next: memory is
+    bounded by the chunk size plus the longest stretch between sentinels,
+    not by the size of the input."""
+    # the partial region is kept as its chunks and joined once it is cut,
+    # so a long stretch without a sentinel is not copied chunk after chunk
+    pieces = []
+    tail = b""
+    for chunk in chunks:
+        if not chunk:
+            continue
+        cut = last_cut(chunk)
+        if cut is None and tail:
+            # a sentinel may straddle the previous chunk's end
+            cut = last_cut(tail + chunk[:_SENTINEL_MAX])
+            if cut is not None:
+                cut -= len(tail)
+        if cut is None:
+            pieces.append(chunk)
+            tail = (tail + chunk[-_SENTINEL_MAX:])[-_SENTINEL_MAX:]
+            continue
+        pieces.append(chunk[:cut])
+        yield b"".join(pieces)
+        rest = chunk[cut:]
+        pieces = [rest] if rest else []
+        tail = rest[-_SENTINEL_MAX:]
+    if pieces:
+        yield b"".join(pieces)
+
+
+def next_cut(data, start: int, end: Optional[int] = None) -> Optional[int]:
+    """The offset just past the first sentinel at or after ``start`` in
+    ``data``, or None."""
+    m = SENTINEL.search(data, start, len(data) if end is None else end)
+    return m.end() if m else None
+
+
+def last_cut(data, start: int = 0, end: Optional[int] = None) -> Optional[int]:
+    """The offset just past the last sentinel in ``data[start:end]``, or
+    None."""
+    if end is None:
+        end = len(data)
+    cut = None
+    for sentinel in SENTINELS:
+        i = data.rfind(sentinel, start, end)
+        if i != -1 and (cut is None or i + len(sentinel) > cut):
+            cut = i + len(sentinel)
+    return cut
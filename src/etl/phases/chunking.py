@@ -0,0 +1,87 @@
+import csv
+import threading
+from pathlib import Path
+from typing import Optional
+
+
+class ChunkLog:
+    """Append-only CSV of every flushed chunk, for offline analysis of the
+    sizes the load phase settled on. Safe to share between writer threads."""
+
+    FIELDS = ("writer", "chunk", "rows", "bytes", "seconds", "next_size")
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        new = not path.exists()
+        self._lock = threading.Lock()
+        self._file = open(path, "a", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+        if new:
+            self._writer.writerow(self.FIELDS)
+
+    def write(self, *values):
+        with self._lock:
+            self._writer.writerow(values)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class ChunkSizer:
+    """Chooses the next chunk size from observed flush latency.
+
+    Keeps an exponentially weighted estimate of seconds per row and aims the
+    next chunk at ``target_seconds``. Each step may at most halve or double
+    the size, and the result is clamped to ``[minimum, maximum]``. With
+    ``adaptive`` off the size stays at ``initial`` and observations are only
+    logged.
+    """
+
+    SMOOTHING = 0.3
+    MAX_STEP = 2.0
+
+    def __init__(
+        self,
+        initial: int,
+        minimum: int,
+        maximum: int,
+        target_seconds: float,
+        adaptive: bool = True,
+        log: Optional[ChunkLog] = None,
+        name: str = "",
+    ):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_seconds = target_seconds
+        self.adaptive = adaptive
+        self.log = log
+        self.name = name
+        self.size = self._clamp(initial) if adaptive else initial
+        self.chunks = 0
+        self._per_row: Optional[float] = None
+
+    def observe(self, rows: int, seconds: float, payload_bytes: int = 0):
+        self.chunks += 1
+
+        if self.adaptive and rows and seconds > 0:
+            per_row = seconds / rows
+            if self._per_row is None:
+                self._per_row = per_row
+            else:
+                a = self.SMOOTHING
+                self._per_row = a * per_row + (1 - a) * self._per_row
+
+            wanted = self.target_seconds / self._per_row
+            wanted = min(self.size * self.MAX_STEP, wanted)
+            wanted = max(self.size / self.MAX_STEP, wanted)
+            self.size = self._clamp(int(wanted))
+
+        if self.log:
+            self.log.write(
+                self.name, self.chunks, rows, payload_bytes, f"{seconds:.6f}", self.size
+            )
+
+    def _clamp(self, size: int) -> int:
+        return max(self.minimum, min(self.maximum, size))
@@ -0,0 +1,39 @@
+import json
+from typing import Any, Callable, Dict, Tuple, Type
+
+# optional: faster decoders are used when installed, stdlib json otherwise
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+DECODERS: Dict[str, Callable[[Any], Any]] = {"json": json.loads}
+# what the backends raise on malformed input
+DECODE_ERRORS: Tuple[Type[Exception], ...] = (ValueError,)
+
+if orjson is not None:
+    DECODERS["orjson"] = orjson.loads
+if msgspec is not None:
+    DECODERS["msgspec"] = msgspec.json.Decoder().decode
+    DECODE_ERRORS += (msgspec.DecodeError,)
+
+# what "auto" picks, fastest first
+PREFERENCE = ("orjson", "msgspec", "json")
+
+
+def decoder(name: str = "auto") -> Callable[[Any], Any]:
+    """The ``loads`` function of the named JSON backend. Every backend
+    takes ``bytes`` or ``str`` and returns plain dicts and lists."""
+    if name == "auto":
+        name = next(n for n in PREFERENCE if n in DECODERS)
+    if name not in DECODERS:
+        raise ValueError(
+            f"JSON decoder {name!r} is not available; "
+            f"installed: {', '.join(sorted(DECODERS))}"
+        )
+    return DECODERS[name]
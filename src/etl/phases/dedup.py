@@ -0,0 +1,69 @@
+from datetime import datetime, timezone
+
+from etl.phases.records import Columns
+
+# what a missing or unreadable ``updated_at`` ranks as: older than any time
+_NEVER = datetime.min.replace(tzinfo=timezone.utc)
+
+
+def dedup(rows):
+    """Collapse rows that share an ``external_id`` within one chunk.
+
+    Postgres refuses to let a single ``ON CONFLICT DO UPDATE`` statement touch
+    the same row twice, so every chunk has to be unique on the conflict key.
+    The row with the latest ``updated_at`` wins, compared as points in time
+    and not as text; a row without one loses to any row that has one. On a
+    tie the one that came later in the input wins. Returns ``(rows,
+    dropped)``; when there are no duplicates the input batch is returned as
+    is; a Columns batch stays columnar.
+    """
+    if isinstance(rows, Columns):
+        return _dedup_columns(rows)
+
+    # fast path: one set build, no per-row comparisons
+    if len({row.external_id for row in rows}) == len(rows):
+        return rows, 0
+
+    latest = {}
+    for row in rows:
+        key = row.external_id
+        seen = latest.get(key)
+        if seen is None or _instant(row.updated_at) >= _instant(seen.updated_at):
+            latest[key] = row
+
+    return list(latest.values()), len(rows) - len(latest)
+
+
+def _dedup_columns(batch):
+    keys = batch.column("external_id")
+    if len(set(keys)) == len(keys):
+        return batch, 0
+
+    updated_at = batch.column("updated_at")
+    latest = {}
+    for i, key in enumerate(keys):
+        seen = latest.get(key)
+        if seen is None or _instant(updated_at[i]) >= _instant(updated_at[seen]):
+            latest[key] = i
+
+    return batch.take(list(latest.values())), len(keys) - len(latest)
+
+
+def _instant(value):
+    """``updated_at`` as an aware datetime, so that offsets, a ``Z`` suffix
+    and fractional seconds compare correctly; naive times are taken as UTC,
+    and None or text that is not ISO-8601 as ``_NEVER``. Only called for
+    rows whose key repeats."""
+    if value is None:
+        return _NEVER
+    if not isinstance(value, datetime):
+        text = str(value)
+        if text.endswith(("Z", "z")):
+            text = text[:-1] + "+00:00"
+        try:
+            value = datetime.fromisoformat(text)
+        except ValueError:
+            return _NEVER
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
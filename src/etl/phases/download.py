@@ -1,19 +1,204 @@
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path, PurePosixPath
+from typing import Dict, List, NamedTuple
+from urllib.parse import urlparse
+
 import requests
-from pathlib import Path
+import yaml
+
 from etl.config.settings import settings
+from etl.phases.download_cache import DownloadCache, link_into
+from etl.phases.fetch import fetch, file_digest, http_session
+
 
 def download(run_id: str, store):
+    """Fetch the run's source to ``temp_dir/<run_id>.zip``.
+
+    Its SHA-256 and size are recorded as the DOWNLOAD checkpoint; a later
+    attempt that finds the file unchanged uses it as is.
+    """
     target = settings.temp_dir / f"{run_id}.zip"
     target.parent.mkdir(parents=True, exist_ok=True)
+    url = settings.source_url
 
-    if target.exists():
-        return target
-
-    with requests.get("https://example.com/data.zip", stream=True, timeout=settings.request_timeout) as r:
-        r.raise_for_status()
-        with open(target, "wb") as f:
-            for chunk in r.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
+    if not _reusable(run_id, "DOWNLOAD", url, target, store):
+        session = http_session(settings.download_segments)
+        fetched = _fetch_to(url, target, session)
+        _record(run_id, "DOWNLOAD", url, target, fetched, store)
 
     return target
+
+
+def load_manifest(path: Path) -> List[dict]:
+    """Read a source manifest: a YAML list of URLs or of ``{name, url}``
+    mappings. Names default to the URL's file name and must be unique, as
+    they key the per-source checkpoints and files."""
+    with open(path) as f:
+        entries = yaml.safe_load(f) or []
+
+    sources = []
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {"url": entry}
+        url = entry["url"]
+        name = entry.get("name") or PurePosixPath(urlparse(url).path).name
+        sources.append({"name": name, "url": url})
+
+    names = [source["name"] for source in sources]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate source names in {path}")
+    return sources
+
+
+def download_all(run_id: str, sources: List[dict], store) -> Dict[str, Path]:
+    """Fetch every source concurrently; returns ``{name: path}`` in manifest
+    order.
+
+    Up to ``download_workers`` files are in flight, at most
+    ``download_per_host`` of them against any one host, all sharing one
+    keep-alive connection pool. Failed fetches are retried with
+    exponential backoff, resuming their partial files. Each completed file
+    is checkpointed as ``DOWNLOAD:<name>`` so no later attempt fetches it
+    again.
+    """
+    run_dir = settings.temp_dir / run_id
+    run_dir.mkdir(parents=True, exist_ok=True)
+
+    paths = {}
+    pending = []
+    for source in sources:
+        path = run_dir / source["name"]
+        phase = f"DOWNLOAD:{source['name']}"
+        if _reusable(run_id, phase, source["url"], path, store):
+            paths[source["name"]] = path
+        else:
+            pending.append((source, path))
+
+    workers = max(1, min(settings.download_workers, len(pending)))
+    # a pool per scheme and host, or they would keep evicting each other
+    pools = {urlparse(source["url"])[:2] for source, _ in pending}
+    session = http_session(workers * settings.download_segments, len(pools))
+    hosts = {}
+    hosts_lock = threading.Lock()
+
+    def host_slot(url):
+        host = urlparse(url).netloc
+        with hosts_lock:
+            if host not in hosts:
+                hosts[host] = threading.BoundedSemaphore(settings.download_per_host)
+            return hosts[host]
+
+    def worker(source, path):
+        with host_slot(source["url"]):
+            return _with_retries(lambda: _fetch_to(source["url"], path, session))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(worker, source, path): source for source, path in pending
+        }
+        # checkpoints are written here, on the caller's thread and session;
+        # one failed source does not keep the others from being recorded
+        errors = []
+        for future in as_completed(futures):
+            source = futures[future]
+            try:
+                fetched = future.result()
+            except Exception as exc:
+                errors.append(exc)
+                continue
+            path = run_dir / source["name"]
+            paths[source["name"]] = path
+            phase = f"DOWNLOAD:{source['name']}"
+            _record(run_id, phase, source["url"], path, fetched, store)
+
+    if errors:
+        raise errors[0]
+
+    return {source["name"]: paths[source["name"]] for source in sources}
+
+
+def _reusable(run_id: str, phase: str, url: str, path: Path, store) -> bool:
+    """Whether ``path`` still holds the file recorded under ``phase``.
+
+    A file whose size and modification time match the record is trusted
+    without being read. One that was touched is hashed once and kept if
+    the content matches. Anything else, a file with no record included
+    (it may be a partial download from before they were atomic), is
+    deleted so that this source alone is fetched again. A cached copy that
+    fails the check is dropped from the cache too, as the file is a link
+    to it.
+    """
+    if not path.exists():
+        return False
+
+    recorded = json.loads(store.get(run_id, phase) or "{}")
+    if recorded.get("url") != url:
+        path.unlink()
+        return False
+
+    stat = path.stat()
+    if (
+        recorded.get("size") == stat.st_size
+        and recorded.get("mtime_ns") == stat.st_mtime_ns
+    ):
+        return True
+
+    digest = file_digest(path)
+    if recorded.get("sha256") != digest.sha256:
+        path.unlink()
+        if settings.download_cache:
+            _cache().discard(url)
+        return False
+
+    _record(run_id, phase, url, path, digest, store)
+    return True
+
+
+def _record(run_id: str, phase: str, url: str, path: Path, digest, store):
+    store.set(
+        run_id,
+        phase,
+        json.dumps(
+            {
+                "url": url,
+                "sha256": digest.sha256,
+                "size": digest.size,
+                "mtime_ns": path.stat().st_mtime_ns,
+            }
+        ),
+    )
+
+
+def _fetch_to(url: str, target: Path, session):
+    if settings.download_cache:
+        blob = _cache().fetch(url, segments=settings.download_segments, session=session)
+        link_into(blob, target)
+        # blobs are named by their SHA-256, so the digest comes for free
+        return _CachedDigest(blob.name, target.stat().st_size)
+
+    return fetch(url, target, segments=settings.download_segments, session=session)
+
+
+def _cache():
+    return DownloadCache(settings.temp_dir / "cache", settings.download_cache_bytes)
+
+
+class _CachedDigest(NamedTuple):
+    sha256: str
+    size: int
+
+
+def _with_retries(fn):
+    for attempt in range(settings.download_retries + 1):
+        try:
+            return fn()
+        except (requests.RequestException, IOError):
+            if attempt == settings.download_retries:
+                raise
+            # exponential backoff with jitter so retries do not synchronise
+            delay = settings.download_backoff * 2**attempt
+            time.sleep(delay * random.uniform(0.5, 1.0))
@@ -0,0 +1,170 @@
+import fcntl
+import hashlib
+import json
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from etl.config.settings import settings
+from etl.phases.fetch import drain, fetch, http_session
+
+
+class DownloadCache:
+    """Content-addressed store of downloaded sources under ``root``.
+
+    Blobs live in ``blobs/<sha256>``; ``index.json`` maps each URL to the
+    validators (ETag / Last-Modified) and digest of the copy we hold. A
+    cached URL is revalidated with a single conditional request and only
+    downloaded again when the server says it changed. Least recently used
+    blobs are evicted once the cache grows past ``max_bytes``.
+    """
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.blobs = root / "blobs"
+        self.incoming = root / "incoming"
+        self.index_path = root / "index.json"
+        self.blobs.mkdir(parents=True, exist_ok=True)
+        self.incoming.mkdir(parents=True, exist_ok=True)
+
+    def fetch(self, url: str, segments: int = 1, session=None) -> Path:
+        """Return the path of an up-to-date cached copy of ``url``."""
+        session = session or http_session(segments)
+
+        with self._index() as index:
+            entry = index.get(url)
+        if entry and not (self.blobs / entry["sha256"]).exists():
+            entry = None
+
+        validators = self._revalidate(session, url, entry)
+        if validators is None:
+            blob = self._touch(url)
+            if blob is not None:
+                return blob
+            # another run evicted it since we looked: download it afresh
+            validators = self._revalidate(session, url, None)
+
+        # named after the validators so resumed parts never mix versions
+        key = hashlib.sha1(json.dumps([url, validators]).encode()).hexdigest()
+        incoming = self.incoming / key
+        fetched = fetch(url, incoming, segments=segments, session=session)
+
+        digest, size = fetched.sha256, fetched.size
+        blob = self.blobs / digest
+        if blob.exists():
+            incoming.unlink()
+        else:
+            os.replace(incoming, blob)
+
+        with self._index() as index:
+            index[url] = {
+                **validators,
+                "sha256": digest,
+                "size": size,
+                "last_used": time.time(),
+            }
+            self._evict(index, keep=digest)
+
+        return blob
+
+    def discard(self, url: str):
+        """Forget ``url`` and delete its blob, for a copy found damaged;
+        other URLs served by the same blob are forgotten with it."""
+        with self._index() as index:
+            entry = index.pop(url, None)
+            if entry is None:
+                return
+            digest = entry["sha256"]
+            for other in [u for u, e in index.items() if e["sha256"] == digest]:
+                del index[other]
+            (self.blobs / digest).unlink(missing_ok=True)
+
+    def _revalidate(self, session, url, entry):
+        """Ask whether our copy is current. Returns None if it is, otherwise
+        the validators of the version the server has now."""
+        headers = {"Range": "bytes=0-0"}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+        with session.get(
+            url, headers=headers, stream=True, timeout=settings.request_timeout
+        ) as r:
+            drain(r)
+            if entry and r.status_code == 304:
+                return None
+            r.raise_for_status()
+            return {
+                "etag": r.headers.get("ETag"),
+                "last_modified": r.headers.get("Last-Modified"),
+            }
+
+    def _touch(self, url):
+        """Mark ``url`` as just used and return its blob, or None if it has
+        left the cache since it was revalidated."""
+        with self._index() as index:
+            entry = index.get(url)
+            if entry is None or not (self.blobs / entry["sha256"]).exists():
+                return None
+            entry["last_used"] = time.time()
+            return self.blobs / entry["sha256"]
+
+    def _evict(self, index, keep):
+        """Drop least recently used blobs until the cache fits its budget.
+
+        Run files are normally hard links, so evicting a blob does not pull
+        the file out from under a run that is still using it.
+        """
+        if not self.max_bytes:
+            return
+
+        by_digest = {}
+        for url, entry in index.items():
+            by_digest.setdefault(entry["sha256"], []).append(url)
+
+        total = sum(index[urls[0]]["size"] for urls in by_digest.values())
+        lru = sorted(
+            by_digest.items(),
+            key=lambda item: max(index[u]["last_used"] for u in item[1]),
+        )
+
+        for digest, urls in lru:
+            if total <= self.max_bytes:
+                break
+            if digest == keep:
+                continue
+            total -= index[urls[0]]["size"]
+            for url in urls:
+                del index[url]
+            (self.blobs / digest).unlink(missing_ok=True)
+
+    @contextmanager
+    def _index(self):
+        """Read-modify-write the index under an exclusive file lock so runs
+        sharing the cache do not lose each other's entries."""
+        with open(self.root / ".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            index = {}
+            if self.index_path.exists():
+                index = json.loads(self.index_path.read_text())
+
+            yield index
+
+            tmp = self.index_path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(index))
+            os.replace(tmp, self.index_path)
+
+
+def link_into(blob: Path, target: Path):
+    """Expose a cached blob as ``target`` without copying it: a hard link
+    where possible, a symlink when the cache is on another filesystem."""
+    tmp = target.with_name(target.name + ".link")
+    tmp.unlink(missing_ok=True)
+    try:
+        os.link(blob, tmp)
+    except OSError:
+        os.symlink(blob.resolve(), tmp)
+    os.replace(tmp, target)
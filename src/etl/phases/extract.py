@@ -1,20 +1,605 @@
+import collections
+import json
+import mmap
+import multiprocessing
+import os
+import queue
+import struct
+import tarfile
+import traceback
 import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
 from pathlib import Path
+from typing import Dict, List, Optional
 
-def extract(run_id: str, zip_path: Path, store):
-    last = store.get(run_id, "EXTRACT")
+from etl.config.settings import settings
+from etl.phases import block_format, formats
 
-    with zipfile.ZipFile(zip_path) as zf:
-        for name in zf.namelist():
-            if last and name <= last:
-                continue
+# bytes read from a member at a time; also what a worker sends back at a
+# time, and WORKER_QUEUE_DEPTH is how many of those it may have queued
+READ_SIZE = 1024 * 1024
+WORKER_QUEUE_DEPTH = 4
+
+# mapped pages already consumed are handed back to the kernel in steps of
+# this size, which is what keeps resident memory flat
+RELEASE_BYTES = 64 * 1024 * 1024
+
+# upper bound on the byte range of a block file one worker parses at a time
+BLOCK_RANGE_BYTES = 4 * 1024 * 1024
+
+_LOCAL_HEADER = struct.Struct("<4sHHHHHIIIHH")
+_ZIP_LOCAL_HEADER = b"PK\x03\x04"
+_FLAG_ENCRYPTED = 0x01
+
+
+@dataclass
+class Position:
+    """Physical read position in the archive.
+
+    ``offset`` is the byte offset into the (decompressed) ``member`` just
+    past the last line handed out, and ``rows`` the number of lines handed
+    out since the start of the archive. ``source_offset`` is only used when
+    streaming: the offset in the raw download where decoding can restart.
+    ``source`` names the archive when a run reads several of them, and
+    ``rows`` then counts across all of them.
+    """
 
-            with zf.open(name) as f:
-                yield from _read_lines(f)
+    source: Optional[str] = None
+    member: Optional[str] = None
+    offset: int = 0
+    rows: int = 0
+    source_offset: int = 0
 
-            store.set(run_id, "EXTRACT", name)
+    def to_cursor(self) -> str:
+        return json.dumps(asdict(self), separators=(",", ":"))
 
+    @classmethod
+    def from_cursor(cls, cursor: Optional[str]) -> "Position":
+        """Parse a cursor written by ``to_cursor``. LOAD cursors from before
+        positions were checkpointed are a bare ``external_id``, which says
+        nothing about where it was read; those restart from the beginning,
+        the upsert making the rows already loaded harmless."""
+        if not cursor:
+            return cls()
+        try:
+            fields = json.loads(cursor)
+        except ValueError:
+            return cls()
+        if not isinstance(fields, dict):
+            return cls()
+        return cls(**fields)
 
-def _read_lines(fileobj):
-    for line in fileobj:
+
+def extract(run_id: str, path: Path, store, position: Optional[Position] = None):
+    """Yield the source's lines one at a time, as ``str``.
+
+    Compatibility adapter over ``extract_batches`` with batches of one
+    line, so ``position`` is exact after every line.
+    """
+    batches = extract_batches(run_id, path, store, position, batch_lines=1)
+    for (line,) in batches:
         yield line.decode("utf-8")
+
+
+def extract_batches(
+    run_id: str,
+    path: Path,
+    store,
+    position: Optional[Position] = None,
+    batch_lines: Optional[int] = None,
+):
+    """Yield the source's lines starting at ``position``, in lists of up to
+    ``batch_lines`` (default ``settings.batch_lines``) raw ``bytes`` lines
+    without their line terminators.
+
+    Members are read in ``READ_SIZE`` blocks and split into lines in bulk;
+    plain files and stored (uncompressed) zip members are memory-mapped
+    instead. A batch never spans two members.
+
+    The format is detected from the file's magic bytes (see
+    ``etl.phases.formats``): a zip, a gzip / bzip2 / xz / zstd stream, or
+    plain text, where a decompressed stream may itself be a tar archive.
+    Tar and zip members map onto ``Position.member``; a single stream is
+    one member named after the file.
+
+    ``position`` is advanced in place past each batch before it is yielded,
+    so a consumer holding the same object can checkpoint exactly what it
+    has received, down to the batch; extraction keeps no checkpoint of its
+    own. ``store`` holds the member manifest of a zip.
+    """
+    if position is None:
+        position = Position()
+
+    reader = _Reader(position, batch_lines or settings.batch_lines)
+    fmt = formats.detect(path)
+    if fmt.open is None:
+        yield from _extract_zip(run_id, path, store, reader)
+    elif fmt is formats.PLAIN and not formats.is_tar_file(path):
+        yield from _extract_mapped(path, reader)
+    else:
+        yield from _extract_stream(path, fmt, reader)
+
+
+def _extract_zip(run_id: str, zip_path: Path, store, reader):
+    """Resuming seeks straight to the recorded member and offset; members
+    before it are not opened and lines before the offset are not parsed
+    (a deflated member still has to be inflated up to the offset). Stored
+    members are read straight out of a mapping of the archive.
+
+    Members are read in the order of the run's manifest, which is pinned
+    on first use, so resume never depends on how member names sort. With
+    ``extract_workers`` above one they are decompressed in worker
+    processes; lines still come out in manifest order.
+    """
+    position = reader.position
+
+    with zipfile.ZipFile(zip_path) as zf, _mapped(zip_path) as mm:
+        manifest = _manifest(run_id, zf, store, position.source)
+        names = [entry["name"] for entry in manifest]
+        first = 0
+
+        if position.member is not None:
+            if position.member not in names:
+                raise ValueError(
+                    f"Resume member {position.member!r} not found in {zip_path}"
+                )
+            first = names.index(position.member)
+
+        workers = min(settings.extract_workers, len(names) - first)
+        if workers > 1:
+            yield from _parallel_batches(zip_path, names[first:], reader)
+            return
+
+        for name in names[first:]:
+            resume = name == position.member and position.offset
+            if not resume:
+                position.member = name
+                position.offset = 0
+
+            info = zf.getinfo(name)
+            if _is_stored(info):
+                start = _data_offset(mm, info)
+                yield from reader.batches_of(
+                    _mapped_pieces(mm, start + position.offset, start + info.file_size)
+                )
+            else:
+                with zf.open(name) as f:
+                    if resume:
+                        f.seek(position.offset)
+                    yield from reader.batches(_blocks(f))
+
+
+def _extract_mapped(path: Path, reader):
+    position = reader.position
+    name = Path(path).name
+    if name != position.member:
+        position.member = name
+        position.offset = 0
+
+    size = os.path.getsize(path)
+    # an empty file cannot be mapped, and has no lines anyway
+    if size > position.offset:
+        with _mapped(path) as mm:
+            yield from reader.batches_of(_mapped_pieces(mm, position.offset, size))
+
+
+def _mapped(path: Path):
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _is_stored(info: zipfile.ZipInfo) -> bool:
+    return (
+        info.compress_type == zipfile.ZIP_STORED
+        and not info.flag_bits & _FLAG_ENCRYPTED
+    )
+
+
+def _data_offset(mm, info: zipfile.ZipInfo) -> int:
+    """Where a member's data starts: past its local header, whose name and
+    extra field lengths may differ from the central directory's."""
+    header = _LOCAL_HEADER.unpack_from(mm, info.header_offset)
+    if header[0] != _ZIP_LOCAL_HEADER:
+        raise zipfile.BadZipFile(f"Bad local header for {info.filename!r}")
+    name_len, extra_len = header[-2:]
+    return info.header_offset + _LOCAL_HEADER.size + name_len + extra_len
+
+
+def _mapped_pieces(mm, start: int, end: int):
+    """``split_lines``-style pieces of ``mm[start:end]``, one per window of
+    about ``READ_SIZE``. The window is cut at its last newline, found with
+    ``rfind`` on the mapping, and split in bulk straight from the mapped
+    pages with no read buffer in between. Consumed pages are released
+    every ``RELEASE_BYTES``, so resident memory stays flat however large
+    the region is."""
+    pos = start
+    released = start - start % mmap.PAGESIZE
+
+    while pos < end:
+        window = min(pos + READ_SIZE, end)
+        cut = -1
+        if window < end:
+            cut = mm.rfind(b"\n", pos, window)
+            if cut == -1:
+                # a line longer than the window
+                cut = mm.find(b"\n", window, end)
+
+        if cut == -1:
+            lines = mm[pos:end].split(b"\n")
+            rest = lines.pop()
+            if lines:
+                yield lines, True
+            if rest:
+                yield [rest], False
+            return
+
+        yield mm[pos:cut].split(b"\n"), True
+        pos = cut + 1
+
+        if pos - released >= RELEASE_BYTES and hasattr(mmap, "MADV_DONTNEED"):
+            upto = pos - pos % mmap.PAGESIZE
+            mm.madvise(mmap.MADV_DONTNEED, released, upto - released)
+            released = upto
+
+
+def _extract_stream(path: Path, fmt, reader):
+    """Compressed streams cannot be seeked, so a resume decompresses up to
+    the recorded member and offset and discards what it skips. Tar members
+    are taken in archive order; there is no manifest to pin."""
+    position = reader.position
+
+    with open(path, "rb") as raw:
+        stream, is_tar = formats.open_stream(raw, fmt)
+        with stream:
+            if not is_tar:
+                yield from _member_batches(stream, Path(path).name, reader)
+                return
+
+            resume_member = position.member
+            with tarfile.open(fileobj=stream, mode="r|") as tar:
+                for info in tar:
+                    if not info.isfile():
+                        continue
+                    if resume_member is not None:
+                        if info.name != resume_member:
+                            continue
+                        resume_member = None
+
+                    yield from _member_batches(tar.extractfile(info), info.name, reader)
+
+            if resume_member is not None:
+                raise ValueError(f"Resume member {resume_member!r} not found in {path}")
+
+
+def _member_batches(f, name, reader):
+    position = reader.position
+    if name == position.member and position.offset:
+        _skip(f, position.offset)
+    else:
+        position.member = name
+        position.offset = 0
+
+    yield from reader.batches(_blocks(f))
+
+
+def _blocks(f):
+    return iter(lambda: f.read(READ_SIZE), b"")
+
+
+def _skip(f, n):
+    while n:
+        data = f.read(min(n, formats.CHUNK_SIZE))
+        if not data:
+            raise EOFError("Source ended before the resume offset")
+        n -= len(data)
+
+
+def extract_blocks(
+    run_id: str,
+    path: Path,
+    store,
+    position: Optional[Position] = None,
+    batch_blocks: Optional[int] = None,
+):
+    """Yield the blocks of a file in the block format (see
+    ``etl.phases.block_format``) starting at ``position``, in lists of up to
+    ``batch_blocks`` (default ``settings.batch_lines``) Block records.
+
+    The file, plain or a gzip / bzip2 / xz / zstd stream, is read in
+    ``READ_SIZE`` blocks and re-cut at sentinels, so only the block being
+    read is ever held beyond the current block of input. ``Position``
+    works as for lines, with ``rows`` counting blocks and ``offset`` just
+    past the sentinel of the last block handed out: the point where a
+    resumed parse starts afresh.
+
+    With ``extract_workers`` above one a plain file is instead split at
+    sentinels into byte ranges that are parsed in worker processes; the
+    batches and positions that come out are the same.
+    """
+    if position is None:
+        position = Position()
+
+    reader = _Reader(position, batch_blocks or settings.batch_lines)
+    name = Path(path).name
+    if name != position.member:
+        position.member = name
+        position.offset = 0
+
+    fmt = formats.detect(path)
+    if fmt.open is None:
+        raise ValueError(f"{path} is a zip archive; block files are read whole")
+
+    if fmt is formats.PLAIN and settings.extract_workers > 1:
+        yield from _block_batches(_parallel_blocks(path, position.offset), reader)
+        return
+
+    with open(path, "rb") as raw:
+        if fmt is formats.PLAIN:
+            stream = raw
+            stream.seek(position.offset)
+        else:
+            stream, is_tar = formats.open_stream(raw, fmt)
+            if is_tar:
+                raise ValueError(f"{path} is a tar archive; block files are read whole")
+            _skip(stream, position.offset)
+
+        with stream:
+            regions = block_format.regions(_blocks(stream))
+            yield from _block_batches(_located(regions, position.offset), reader)
+
+
+def _located(regions, base):
+    """``(block, end)`` for the blocks of consecutive ``regions`` starting
+    at stream offset ``base``, ``end`` being the stream offset past the
+    block's sentinel."""
+    for i, region in enumerate(regions):
+        start = block_format.preamble_end(region) if i == 0 and not base else 0
+        for block, end in block_format.parse(region, start):
+            yield block, base + end
+        base += len(region)
+
+
+def _block_batches(located, reader):
+    position = reader.position
+    batch = []
+
+    for block, end in located:
+        batch.append(block)
+        if len(batch) >= reader.batch_lines:
+            reader.advance(len(batch), end - position.offset)
+            yield batch
+            batch = []
+
+    if batch:
+        reader.advance(len(batch), end - position.offset)
+        yield batch
+
+
+def _parallel_blocks(path: Path, offset: int):
+    """``_located`` for a plain file from ``offset``, parsed in a pool of
+    ``extract_workers`` processes.
+
+    The file is split into byte ranges at the first sentinel past evenly
+    spaced offsets, at most ``BLOCK_RANGE_BYTES`` apart. A range that
+    starts just past a sentinel parses exactly as it would in place (see
+    ``block_format.regions``), so the blocks merged back in range order are
+    those of a sequential parse. Each worker maps the file itself; only
+    the cut points are found here, and at most two ranges per worker are
+    in flight.
+    """
+    workers = settings.extract_workers
+    size = os.path.getsize(path)
+    if size <= offset:
+        return
+    step = min(BLOCK_RANGE_BYTES, -(-(size - offset) // workers))
+    ctx = multiprocessing.get_context("spawn")
+
+    with _mapped(path) as mm, ProcessPoolExecutor(workers, mp_context=ctx) as pool:
+        pending = collections.deque()
+        start = offset
+        try:
+            while start < size or pending:
+                while start < size and len(pending) < 2 * workers:
+                    end = size
+                    if start + step < size:
+                        end = block_format.next_cut(mm, start + step) or size
+                    pending.append(pool.submit(_block_range, path, start, end))
+                    start = end
+
+                blocks, ends = pending.popleft().result()
+                yield from zip(map(block_format.Block._make, blocks), ends)
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def _block_range(path, start, end):
+    with _mapped(path) as mm:
+        first = block_format.preamble_end(mm) if start == 0 else start
+        blocks = []
+        ends = []
+        for block, block_end in block_format.parse(mm, first, end):
+            # plain tuples pickle faster than NamedTuple instances
+            blocks.append(tuple(block))
+            ends.append(block_end)
+    return blocks, ends
+
+
+def extract_all(
+    run_id: str,
+    archives: Dict[str, Path],
+    store,
+    position: Position,
+):
+    """Chain ``extract_batches`` over several archives in the given order,
+    resuming inside the archive named by ``position.source``."""
+    names = list(archives)
+    first = names.index(position.source) if position.source is not None else 0
+
+    for name in names[first:]:
+        if name != position.source:
+            position.source = name
+            position.member = None
+            position.offset = 0
+        yield from extract_batches(run_id, archives[name], store, position)
+
+
+def _manifest(run_id: str, zf: zipfile.ZipFile, store, source=None) -> List[dict]:
+    """The run's member list in central-directory order, recorded on first
+    use and checked against the archive on every later attempt."""
+    current = [
+        {"name": info.filename, "size": info.file_size, "crc": info.CRC}
+        for info in zf.infolist()
+        if not info.is_dir()
+    ]
+
+    phase = "EXTRACT:manifest"
+    if source is not None:
+        phase = f"{phase}:{source}"
+
+    recorded = store.get(run_id, phase)
+    if recorded is None:
+        store.set(run_id, phase, json.dumps(current))
+        return current
+
+    manifest = json.loads(recorded)
+    if sorted(manifest, key=lambda e: e["name"]) != sorted(
+        current, key=lambda e: e["name"]
+    ):
+        raise ValueError(
+            f"Archive {zf.filename} no longer matches the manifest of run {run_id}"
+        )
+    return manifest
+
+
+class _Reader:
+    """Turns blocks of bytes into batches of lines, advancing ``position``
+    past each batch before it is handed out."""
+
+    def __init__(self, position, batch_lines):
+        self.position = position
+        self.batch_lines = batch_lines
+
+    def batches(self, blocks):
+        return self.batches_of(split_lines(blocks))
+
+    def batches_of(self, pieces):
+        """Re-slice ``(lines, terminated)`` pieces, as ``split_lines``
+        produces them, into batches of at most ``batch_lines``."""
+        size = self.batch_lines
+
+        for lines, terminated in pieces:
+            for i in range(0, len(lines), size):
+                batch = lines[i : i + size] if len(lines) > size else lines
+                n = sum(map(len, batch))
+                if terminated:
+                    n += len(batch)
+
+                self.advance(len(batch), n)
+                yield batch
+
+    def advance(self, rows, n):
+        """Move the position ``rows`` rows and ``n`` bytes further."""
+        self.position.offset += n
+        self.position.rows += rows
+
+
+def split_lines(blocks):
+    """Split an iterable of byte blocks into lines in bulk.
+
+    Yields ``(lines, True)`` per block, the lines without their newlines,
+    holding a trailing partial line back for the next block; then
+    ``([rest], False)`` if the input does not end with a newline.
+    """
+    pending = b""
+    for block in blocks:
+        lines = (pending + block).split(b"\n")
+        pending = lines.pop()
+        if lines:
+            yield lines, True
+    if pending:
+        yield [pending], False
+
+
+def _parallel_batches(zip_path, names, reader):
+    """Decompress and split ``names`` in ``extract_workers`` processes, each
+    with its own ``ZipFile`` handle, and yield their lines in order.
+
+    Members are dealt out round-robin and every worker works through its
+    share in order, so reading member after member from the matching
+    worker's queue never waits on a worker that is blocked on a full
+    queue. Each queue holds at most ``WORKER_QUEUE_DEPTH`` batches, which
+    bounds memory however far ahead the workers could get.
+    """
+    position = reader.position
+    ctx = multiprocessing.get_context("spawn")
+    workers = min(settings.extract_workers, len(names))
+
+    shares = [[] for _ in range(workers)]
+    for i, name in enumerate(names):
+        offset = position.offset if name == position.member else 0
+        shares[i % workers].append((name, offset))
+
+    queues = [ctx.Queue(WORKER_QUEUE_DEPTH) for _ in range(workers)]
+    procs = [
+        ctx.Process(target=_member_worker, args=(str(zip_path), share, q), daemon=True)
+        for share, q in zip(shares, queues)
+    ]
+    for proc in procs:
+        proc.start()
+
+    try:
+        for i, name in enumerate(names):
+            if name != position.member or not position.offset:
+                position.member = name
+                position.offset = 0
+
+            pieces = _received(queues[i % workers], procs[i % workers])
+            yield from reader.batches_of(pieces)
+    finally:
+        for proc in procs:
+            if proc.is_alive():
+                proc.terminate()
+            proc.join()
+
+
+def _member_worker(zip_path, share, out):
+    """Worker process: send each member's lines as ``split_lines`` pieces
+    of one ``READ_SIZE`` block each, then None to mark its end."""
+    try:
+        with zipfile.ZipFile(zip_path) as zf:
+            for name, offset in share:
+                with zf.open(name) as f:
+                    if offset:
+                        f.seek(offset)
+                    for piece in split_lines(_blocks(f)):
+                        out.put(piece)
+
+                out.put(None)
+    except Exception:
+        out.put(RuntimeError(f"Extract worker failed:\n{traceback.format_exc()}"))
+
+
+def _received(q, proc):
+    """Pieces of one member from worker queue ``q``, failing instead of
+    waiting forever if the worker dies."""
+    while True:
+        try:
+            piece = q.get(timeout=1)
+        except queue.Empty:
+            if proc.is_alive():
+                continue
+            # it may have exited right after its last put
+            try:
+                piece = q.get(timeout=1)
+            except queue.Empty:
+                raise RuntimeError(
+                    f"Extract worker exited with code {proc.exitcode}"
+                ) from None
+
+        if piece is None:
+            return
+        if isinstance(piece, Exception):
+            raise piece
+        yield piece
@@ -0,0 +1,240 @@
+import glob
+import hashlib
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from etl.config.settings import settings
+
+CHUNK_SIZE = 1024 * 1024
+
+_CONTENT_RANGE = re.compile(r"bytes \d+-\d+/(\d+)")
+
+
+class Digest:
+    """SHA-256 and byte count of a file, fed with the bytes as they are
+    written so the file never has to be read back to fingerprint it."""
+
+    def __init__(self):
+        self._sha256 = hashlib.sha256()
+        self.size = 0
+
+    def update(self, data: bytes):
+        self._sha256.update(data)
+        self.size += len(data)
+
+    @property
+    def sha256(self) -> str:
+        return self._sha256.hexdigest()
+
+
+def fetch(url: str, target: Path, segments: int = 1, session=None) -> Digest:
+    """Download ``url`` to ``target`` atomically and return its digest.
+
+    When the server honours ``Range`` requests the body is split into
+    ``segments`` byte ranges fetched concurrently, each into its own
+    ``<target>.part-<first>-<last>`` file that picks up where it stopped on
+    a retry. The parts are then joined into ``<target>.part``, checked
+    against the advertised size and renamed into place.
+
+    Bytes left behind are only resumed from while the server's validator
+    (strong ETag, else Last-Modified) is still the one recorded next to
+    them in ``<target>.part.version``, and every range is requested with
+    ``If-Range``, so a file that changed upstream is never stitched
+    together from two versions. Without a validator nothing is resumed.
+
+    The digest is computed on the way to disk: while the body is written
+    for a single range, while the parts are joined for several. Only bytes
+    a previous attempt left behind are read back.
+    """
+    session = session or http_session(segments)
+    size, ranged, validator = _probe(session, url)
+    part = target.with_name(target.name + ".part")
+    version = part.with_name(part.name + ".version")
+    digest = Digest()
+
+    recorded = version.read_text() if version.exists() else None
+    if not ranged or validator is None or recorded != validator:
+        _discard(part)
+        if ranged and validator is not None:
+            version.write_text(validator)
+        else:
+            version.unlink(missing_ok=True)
+
+    if ranged and size and segments > 1:
+        _fetch_segmented(session, url, part, size, segments, digest, validator)
+    else:
+        _discard(part, keep=[part])
+        _fetch_range(session, url, part, 0, size, ranged, digest, validator)
+
+    if size is not None and digest.size != size:
+        raise IOError(f"Downloaded {digest.size} bytes from {url}, expected {size}")
+
+    os.replace(part, target)
+    version.unlink(missing_ok=True)
+    return digest
+
+
+def file_digest(path: Path, digest: Optional[Digest] = None) -> Digest:
+    """Digest of the bytes already in ``path``, added to ``digest`` if
+    given."""
+    digest = digest or Digest()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest
+
+
+def http_session(segments, hosts=1):
+    """A session keeping up to ``segments`` connections alive to each of
+    ``hosts`` hosts; a pool for any further host evicts the oldest."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=max(hosts, 1), pool_maxsize=max(segments, 1))
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _probe(session, url):
+    """Return ``(size, supports_ranges, validator)`` using a one-byte range
+    request, ``validator`` being what ``If-Range`` can be sent with: a
+    strong ETag, else Last-Modified, else None."""
+    with session.get(
+        url,
+        headers={"Range": "bytes=0-0"},
+        stream=True,
+        timeout=settings.request_timeout,
+    ) as r:
+        r.raise_for_status()
+        drain(r)
+
+        etag = r.headers.get("ETag")
+        # If-Range only takes a strong ETag
+        if etag is not None and etag.startswith("W/"):
+            etag = None
+        validator = etag or r.headers.get("Last-Modified")
+
+        if r.status_code == 206:
+            m = _CONTENT_RANGE.match(r.headers.get("Content-Range", ""))
+            if m:
+                return int(m.group(1)), True, validator
+
+        length = r.headers.get("Content-Length")
+        return (int(length) if length is not None else None), False, validator
+
+
+def drain(r):
+    """Read a short response to its end, a one-byte range or a 304, so its
+    connection goes back to the pool rather than being closed with it. A
+    full body is not worth reading for that and is left alone."""
+    if r.status_code in (206, 304):
+        r.content
+
+
+def _discard(part, keep=()):
+    """Delete what earlier attempts left for ``part``, the joined file and
+    segments of whatever layout, except the files in ``keep``."""
+    pattern = re.compile(re.escape(part.name) + r"(?:-\d+-\d+|\d+)?")
+    for path in part.parent.glob(glob.escape(part.name) + "*"):
+        if pattern.fullmatch(path.name) and path not in keep:
+            path.unlink()
+
+
+def _fetch_segmented(session, url, part, size, segments, digest, validator):
+    # joined on a previous attempt that stopped short of the rename
+    if part.exists() and part.stat().st_size == size:
+        file_digest(part, digest)
+        return
+
+    bounds = [size * i // segments for i in range(segments + 1)]
+    # named by byte range, so a retry with another segment count never
+    # resumes a part into the wrong place
+    parts = [
+        part.with_name(f"{part.name}-{start}-{end - 1}")
+        for start, end in zip(bounds, bounds[1:])
+    ]
+    _discard(part, keep=parts)
+
+    with ThreadPoolExecutor(max_workers=segments) as pool:
+        futures = [
+            pool.submit(
+                _fetch_range,
+                session,
+                url,
+                path,
+                start,
+                end - start,
+                True,
+                validator=validator,
+            )
+            for path, start, end in zip(parts, bounds, bounds[1:])
+        ]
+        for future in futures:
+            future.result()
+
+    # segments arrive out of order, so the digest is taken while joining
+    with open(part, "wb") as out:
+        for path in parts:
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                    digest.update(chunk)
+                    out.write(chunk)
+
+    for path in parts:
+        path.unlink()
+
+
+def _fetch_range(
+    session, url, path, start, length, ranged, digest=None, validator=None
+):
+    """Fetch ``length`` bytes starting at ``start`` into ``path``, resuming
+    from whatever a previous attempt already wrote there. With ``length``
+    unknown (``None``) the body is read to the end. ``digest``, if given,
+    is fed every byte that ends up in ``path``. ``validator`` is sent as
+    ``If-Range``, so the server answers with the whole body instead of the
+    range if the file has changed since."""
+    have = path.stat().st_size if ranged and path.exists() else 0
+    if length is not None and have > length:
+        # not a prefix of this range; start it over
+        have = 0
+    if digest is not None and have:
+        file_digest(path, digest)
+    if length is not None and have == length:
+        return
+
+    headers = {}
+    if ranged:
+        end = f"{start + length - 1}" if length is not None else ""
+        headers["Range"] = f"bytes={start + have}-{end}"
+        if validator is not None:
+            headers["If-Range"] = validator
+
+    with session.get(
+        url, headers=headers, stream=True, timeout=settings.request_timeout
+    ) as r:
+        r.raise_for_status()
+        if ranged and r.status_code != 206:
+            if validator is not None:
+                raise IOError(f"{url} changed while it was being downloaded")
+            raise IOError(f"Server ignored Range request for {url}")
+
+        written = 0
+        with open(path, "ab" if have else "wb") as f:
+            for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                if chunk:
+                    f.write(chunk)
+                    written += len(chunk)
+                    if digest is not None:
+                        digest.update(chunk)
+
+    # urllib3 1.x ends a body cut short by the peer as if it were complete;
+    # failing here keeps the part for the next attempt to resume
+    if length is not None and have + written < length:
+        raise IOError(
+            f"Got {have + written} of {length} bytes at offset {start} from {url}"
+        )
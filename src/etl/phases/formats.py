@@ -0,0 +1,120 @@
+import bz2
+import gzip
+import io
+import lzma
+import tarfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Callable, List, Optional
+
+# optional: zstd sources are only recognised when the library is installed
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass(frozen=True)
+class Format:
+    """A source format, recognised by the bytes it starts with.
+
+    ``open`` wraps the raw file in a streaming decompressor; it is None for
+    zip, whose members are read through ``zipfile`` instead.
+    """
+
+    name: str
+    magic: bytes
+    open: Optional[Callable[[BinaryIO], BinaryIO]]
+
+
+ZIP = Format("zip", b"PK\x03\x04", None)
+ZIP_EMPTY = Format("zip", b"PK\x05\x06", None)
+PLAIN = Format("plain", b"", lambda f: f)
+
+FORMATS: List[Format] = [ZIP, ZIP_EMPTY]
+
+
+def register(fmt: Format):
+    """Add a format to the ones ``detect`` recognises."""
+    FORMATS.append(fmt)
+
+
+register(Format("gzip", b"\x1f\x8b", lambda f: gzip.GzipFile(fileobj=f)))
+register(Format("bzip2", b"BZh", lambda f: bz2.BZ2File(f)))
+register(Format("xz", b"\xfd7zXZ\x00", lambda f: lzma.LZMAFile(f)))
+
+if zstandard is not None:
+    register(
+        Format(
+            "zstd",
+            b"\x28\xb5\x2f\xfd",
+            lambda f: zstandard.ZstdDecompressor().stream_reader(
+                f, read_across_frames=True
+            ),
+        )
+    )
+
+
+def detect(path: Path) -> Format:
+    """The format of ``path`` by its magic bytes; anything unrecognised is
+    read as plain text."""
+    with open(path, "rb") as f:
+        head = f.read(max(len(fmt.magic) for fmt in FORMATS))
+    for fmt in FORMATS:
+        if head.startswith(fmt.magic):
+            return fmt
+    return PLAIN
+
+
+def open_stream(raw: BinaryIO, fmt: Format):
+    """Decompress ``raw`` as ``fmt``. Returns ``(stream, is_tar)``: a
+    buffered reader over the decompressed bytes, and whether they form a
+    tar archive (told from the ustar magic in the first header block)."""
+    data = fmt.open(raw)
+
+    head = b""
+    while len(head) < tarfile.BLOCKSIZE:
+        piece = data.read(tarfile.BLOCKSIZE - len(head))
+        if not piece:
+            break
+        head += piece
+
+    return io.BufferedReader(_Rewound(head, data), CHUNK_SIZE), is_tar(head)
+
+
+def is_tar(head: bytes) -> bool:
+    """Whether ``head``, the first header block of a stream, opens a tar
+    archive."""
+    return head[257:262] == b"ustar"
+
+
+def is_tar_file(path: Path) -> bool:
+    with open(path, "rb") as f:
+        return is_tar(f.read(tarfile.BLOCKSIZE))
+
+
+class _Rewound(io.RawIOBase):
+    """``f`` with ``head``, already read from it, put back in front."""
+
+    def __init__(self, head: bytes, f):
+        self._head = head
+        self._f = f
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        if self._head:
+            n = min(len(b), len(self._head))
+            b[:n] = self._head[:n]
+            self._head = self._head[n:]
+            return n
+        data = self._f.read(len(b))
+        b[: len(data)] = data
+        return len(data)
+
+    def close(self):
+        self._f.close()
+        super().close()
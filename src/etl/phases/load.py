@@ -1,29 +1,584 @@
+import io
+import queue
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+
+import psycopg2
+import sqlalchemy
+from psycopg2.extras import execute_values
+from sqlalchemy import literal_column, or_
 from sqlalchemy.dialects.postgresql import insert
+from etl.db.database import Session
 from etl.db.models import Customer
 from etl.config.settings import settings
+from etl.metadata.checkpoint_store import CheckpointStore
+from etl.phases.chunking import ChunkLog, ChunkSizer
+from etl.phases.dedup import dedup
+from etl.phases.extract import Position
+from etl.phases.quarantine import Quarantine, reason, text
+from etl.phases.records import Columns, CustomerRecord
+
+COLUMNS = CustomerRecord._fields
+
+STAGE_TABLE = "customer_stage"
+
+# Staging table lives for the lifetime of the connection and is truncated
+# after every merge, since a group commit may span several chunks.
+# Temp tables are never WAL-logged, which is what we want for scratch data.
+CREATE_STAGE_SQL = f"""
+    CREATE TEMP TABLE IF NOT EXISTS {STAGE_TABLE}
+    AS SELECT {', '.join(COLUMNS)} FROM {Customer.__tablename__} WITH NO DATA
+"""
+
+COPY_SQL = f"COPY {STAGE_TABLE} ({', '.join(COLUMNS)}) FROM STDIN"
+
+# xmax is 0 only on freshly inserted tuples; an ON CONFLICT update sets it
+ON_CONFLICT_SQL = """
+        ON CONFLICT (external_id)
+        DO UPDATE SET name = EXCLUDED.name,
+                      email = EXCLUDED.email,
+                      updated_at = EXCLUDED.updated_at
+        {guard}
+        RETURNING (xmax = 0) AS inserted
+"""
+
+MERGE_SQL = f"""
+    WITH merged AS (
+        INSERT INTO {Customer.__tablename__} ({', '.join(COLUMNS)})
+        SELECT {', '.join(COLUMNS)} FROM {STAGE_TABLE}
+        {ON_CONFLICT_SQL}
+    )
+    SELECT count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted)
+    FROM merged
+"""
+
+# execute_values expands the single %s into pages of VALUES tuples
+VALUES_SQL = f"""
+    INSERT INTO {Customer.__tablename__} ({', '.join(COLUMNS)})
+    VALUES %s
+    {ON_CONFLICT_SQL}
+"""
+
+# records are tuples in COLUMNS order, bound positionally
+VALUES_TEMPLATE = "(" + ", ".join("%s" for _ in COLUMNS) + ")"
+
+# only rewrite rows whose content actually differs, so unchanged rows cost
+# no new tuple version, no WAL and no vacuum work
+CHANGED_GUARD = f"""
+        WHERE ({Customer.__tablename__}.name,
+               {Customer.__tablename__}.email,
+               {Customer.__tablename__}.updated_at)
+        IS DISTINCT FROM (EXCLUDED.name, EXCLUDED.email, EXCLUDED.updated_at)
+"""
+
+UPSERT_MODES = ("always", "changed")
+
+
+def _guarded(sql):
+    """Render ``sql`` once per upsert mode, keyed by ``changed_only``."""
+    return {False: sql.format(guard=""), True: sql.format(guard=CHANGED_GUARD)}
+
+
+_MERGE_SQL = _guarded(MERGE_SQL)
+_VALUES_SQL = _guarded(VALUES_SQL)
+
+TRUNCATE_STAGE_SQL = f"TRUNCATE {STAGE_TABLE}"
+
+# COPY text format: backslash, tab and line breaks must be escaped, NULL is \N
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+# chunks queued per partition worker before the reader blocks
+PARTITION_QUEUE_DEPTH = 2
+
+# errors that blame the rows rather than the connection: worth bisecting
+ROW_ERRORS = (
+    sqlalchemy.exc.DataError,
+    sqlalchemy.exc.IntegrityError,
+    psycopg2.DataError,
+    psycopg2.IntegrityError,
+)
+
+
+@dataclass
+class LoadStats:
+    inserted: int = 0
+    updated: int = 0
+    skipped: int = 0
+    duplicates: int = 0
+    rejected: int = 0
+
+    def __iadd__(self, other):
+        self.inserted += other.inserted
+        self.updated += other.updated
+        self.skipped += other.skipped
+        self.duplicates += other.duplicates
+        self.rejected += other.rejected
+        return self
+
+    def to_cursor(self):
+        return (
+            f"{self.inserted},{self.updated},{self.skipped},{self.duplicates},"
+            f"{self.rejected}"
+        )
+
+    @classmethod
+    def from_cursor(cls, cursor):
+        if not cursor:
+            return cls()
+        return cls(*(int(n) for n in cursor.split(",")))
+
+
+def resume_position(run_id, store):
+    """Where extraction has to restart so that no uncommitted row is lost.
+
+    For a partitioned run that is the least advanced partition; the others
+    skip the rows they already committed (see ``_load_partitioned``).
+    """
+    partitions = _partition_count(run_id, store)
+    if partitions <= 1:
+        return Position.from_cursor(store.get(run_id, "LOAD"))
+
+    positions = [
+        Position.from_cursor(store.get(run_id, f"LOAD:p{p}")) for p in range(partitions)
+    ]
+    return min(positions, key=lambda pos: pos.rows)
+
+
+def load(run_id, rows, session, store, position):
+    """Per-row adapter over ``load_batches``, for a ``position`` that
+    advances one row at a time."""
+    batches = ([row] for row in rows)
+    return load_batches(run_id, batches, session, store, position)
+
+
+def load_batches(run_id, batches, session, store, position):
+    """Upsert ``batches`` of rows into the target table and return the
+    LoadStats accumulated over every attempt of ``run_id``.
+
+    ``position`` is the live extract Position feeding ``batches``, already
+    past every row of a batch once that batch arrives; it is checkpointed
+    with every chunk so a resume can seek straight to it. A chunk is
+    therefore only cut between batches: it is flushed at the first batch
+    boundary at or past the chunk size.
+
+    Batches are lists of records or Columns batches; a chunk keeps the kind
+    of its batches, so columnar rows reach COPY and execute_values without
+    ever being built into per-row records.
+
+    With ``settings.max_rejects`` set, the lines transform left out of a
+    batch and the rows the database refuses are quarantined (see
+    ``ChunkWriter``) and counted with the chunk they arrived in.
+    """
+    partitions = _partition_count(run_id, store)
+    if partitions > 1:
+        return _load_partitioned(run_id, batches, session, store, position, partitions)
+
+    chunk_log = _chunk_log(run_id)
+    sizer = _chunk_sizer("LOAD", chunk_log)
+    quarantine = _quarantine(run_id, [store.get(run_id, "LOAD:stats")])
+    writer = ChunkWriter(run_id, "LOAD", session, store, sizer, quarantine)
+    buffer = None
+    rejected = 0
+    lines = [] if quarantine else None
+
+    try:
+        for batch in batches:
+            if quarantine:
+                rejected += _quarantine_lines(quarantine, batch, position)
+                lines.extend(number for number, _ in _numbered(batch, position.rows))
+
+            if buffer is None:
+                buffer = batch.copy()
+            else:
+                buffer.extend(batch)
+
+            if len(buffer) >= writer.sizer.size:
+                writer.write(buffer, position.to_cursor(), rejected, lines)
+                buffer = None
+                rejected = 0
+                lines = [] if quarantine else None
+
+        if buffer or rejected:
+            writer.write(buffer or [], position.to_cursor(), rejected, lines)
+
+        writer.finish(position.to_cursor())
+    finally:
+        if chunk_log:
+            chunk_log.close()
+        if quarantine:
+            quarantine.close()
+
+    return writer.stats
+
+
+class ChunkWriter:
+    """Flushes chunks on one session, staging the ``phase`` checkpoint and
+    running row counts next to each chunk and feeding the measured latency
+    back to the sizer.
+
+    With a ``quarantine`` every chunk is flushed under a savepoint, and a
+    chunk the database refuses is bisected down to the rows at fault: those
+    are quarantined and the rest of the chunk is still loaded.
+    """
+
+    def __init__(self, run_id, phase, session, store, sizer, quarantine=None):
+        self.run_id = run_id
+        self.phase = phase
+        self.session = session
+        self.store = store
+        self.sizer = sizer
+        self.flush = _flusher(settings.load_mode)
+        self.commits = GroupCommit(session)
+        self.measure_bytes = bool(settings.commit_bytes) or sizer.adaptive
+        self.changed_only = _changed_only(settings.upsert_mode)
+        self.stats = LoadStats.from_cursor(store.get(run_id, f"{phase}:stats"))
+        self.quarantine = quarantine
+
+    def write(self, chunk, cursor, rejected=0, lines=None):
+        """Flush ``chunk``; ``rejected`` counts the lines transform already
+        quarantined on the way to it. ``lines``, the input line number of
+        each row of ``chunk``, goes with the rows the database refuses."""
+        started = time.perf_counter()
+
+        unique, dropped = dedup(chunk)
+        if self.quarantine is None:
+            inserted, updated = self.flush(unique, self.session, self.changed_only)
+            failed = 0
+        else:
+            numbers = _line_numbers(chunk, lines) if lines else {}
+            inserted, updated, failed = self._isolate(unique, cursor, numbers)
+        self.stats += LoadStats(
+            inserted,
+            updated,
+            len(unique) - failed - inserted - updated,
+            dropped,
+            rejected + failed,
+        )
+
+        self.store.stage(self.run_id, self.phase, cursor)
+        self.store.stage(self.run_id, f"{self.phase}:stats", self.stats.to_cursor())
+        payload = _payload_bytes(chunk) if self.measure_bytes else 0
+        self.commits.add(len(chunk), payload)
+
+        self.sizer.observe(len(chunk), time.perf_counter() - started, payload)
+
+    def _isolate(self, rows, cursor, numbers):
+        """Returns ``(inserted, updated, rejected)``."""
+        if not rows:
+            return 0, 0, 0
+        try:
+            with self.session.begin_nested():
+                inserted, updated = self.flush(rows, self.session, self.changed_only)
+            return inserted, updated, 0
+        except ROW_ERRORS as exc:
+            if len(rows) == 1:
+                row = next(iter(rows))
+                position = Position.from_cursor(cursor)
+                number = numbers.get((row.external_id, row.updated_at))
+                self.quarantine.reject(
+                    "LOAD", reason(exc), position, number, row._asdict()
+                )
+                return 0, 0, 1
+
+        mid = len(rows) // 2
+        first = self._isolate(rows[:mid], cursor, numbers)
+        second = self._isolate(rows[mid:], cursor, numbers)
+        return tuple(a + b for a, b in zip(first, second))
+
+    def finish(self, cursor=None):
+        if cursor is not None:
+            self.store.stage(self.run_id, self.phase, cursor)
+        self.session.commit()
+
+
+class GroupCommit:
+    """Decides when the chunks written on a session get committed.
+
+    Without a budget every chunk is committed on its own. With
+    ``commit_rows`` and/or ``commit_bytes`` set, chunks (and their staged
+    checkpoints) accumulate in one transaction until either budget is
+    reached, trading replay on crash for fewer commits and fsyncs.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self.rows = 0
+        self.bytes = 0
+
+    def add(self, rows, payload_bytes=0):
+        self.rows += rows
+        self.bytes += payload_bytes
+
+        if self._due():
+            self.session.commit()
+            self.rows = 0
+            self.bytes = 0
+
+    def _due(self):
+        if not settings.commit_rows and not settings.commit_bytes:
+            return True
+        if settings.commit_rows and self.rows >= settings.commit_rows:
+            return True
+        return bool(settings.commit_bytes) and self.bytes >= settings.commit_bytes
 
-def load(run_id, rows, session, store):
-    buffer = []
-    last_key = store.get(run_id, "LOAD")
 
-    for row in rows:
-        if last_key and row["external_id"] <= last_key:
-            continue
+def _payload_bytes(chunk):
+    # approximate wire size: the text form of every non-NULL value
+    groups = chunk.columns if isinstance(chunk, Columns) else chunk
+    return sum(len(str(v)) for group in groups for v in group if v is not None)
 
-        buffer.append(row)
 
-        if len(buffer) >= settings.chunk_size:
-            _flush(buffer, session)
-            store.set(run_id, "LOAD", buffer[-1]["external_id"])
-            buffer.clear()
+def _quarantine(run_id, stats_cursors):
+    if not settings.max_rejects:
+        return None
+    # rejects already committed by earlier attempts count against the budget
+    already = sum(LoadStats.from_cursor(c).rejected for c in stats_cursors)
+    path = settings.temp_dir / f"{run_id}.rejects.ndjson"
+    return Quarantine(path, settings.max_rejects, already)
 
-    if buffer:
-        _flush(buffer, session)
-        store.set(run_id, "LOAD", buffer[-1]["external_id"])
 
+def _numbered(batch, end):
+    """``(line number, row)`` for the rows of ``batch``, whose input ended
+    at line ``end``; lines transform rejected keep their numbers."""
+    rejected = getattr(batch, "rejected", ())
+    first = end - len(batch) - len(rejected)
+    if not rejected:
+        return enumerate(batch, first + 1)
 
-def _flush(rows, session):
-    stmt = insert(Customer).values(rows)
+    skipped = {i for i, _, _ in rejected}
+    lines = range(len(batch) + len(rejected))
+    return zip((first + 1 + i for i in lines if i not in skipped), batch)
+
+
+def _line_numbers(chunk, lines):
+    """Line numbers of the rows of ``chunk`` by ``(external_id,
+    updated_at)``, which is unique among the rows ``dedup`` keeps: of the
+    rows sharing both it keeps the last, and so does this."""
+    if isinstance(chunk, Columns):
+        keys = zip(chunk.column("external_id"), chunk.column("updated_at"))
+    else:
+        keys = ((row.external_id, row.updated_at) for row in chunk)
+    return dict(zip(keys, lines))
+
+
+def _quarantine_lines(quarantine, batch, position, after=0):
+    """Quarantine the lines transform rejected from ``batch``, which ends at
+    ``position``, skipping those up to line ``after`` that an earlier
+    attempt already recorded. Returns how many were quarantined."""
+    rejected = getattr(batch, "rejected", ())
+    first = position.rows - len(batch) - len(rejected)
+    count = 0
+    for i, why, line in rejected:
+        number = first + 1 + i
+        if number > after:
+            quarantine.reject("TRANSFORM", why, position, number, text(line))
+            count += 1
+    return count
+
+
+def _chunk_log(run_id):
+    if not settings.adaptive_chunks:
+        return None
+    return ChunkLog(settings.temp_dir / f"{run_id}.chunks.csv")
+
+
+def _chunk_sizer(name, chunk_log):
+    return ChunkSizer(
+        settings.chunk_size,
+        settings.chunk_min,
+        settings.chunk_max,
+        settings.chunk_target_seconds,
+        adaptive=settings.adaptive_chunks,
+        log=chunk_log,
+        name=name,
+    )
+
+
+def _partition_count(run_id, store):
+    """Number of partitions for this run.
+
+    The count is pinned on first use so that a resumed run routes every key
+    to the same partition (and therefore the same checkpoint) as before,
+    even if ETL_LOAD_WORKERS changed in between. A serial count of 1 is
+    pinned too, or a serial attempt retried with more workers would look
+    for partition checkpoints that were never written.
+    """
+    pinned = store.get(run_id, "LOAD:partitions")
+    if pinned:
+        return int(pinned)
+
+    partitions = settings.load_workers
+    if store.get(run_id, "LOAD") is not None:
+        # a serial attempt from before the count was always pinned
+        partitions = 1
+    store.set(run_id, "LOAD:partitions", str(partitions))
+    return partitions
+
+
+def _partition_of(external_id, partitions):
+    # crc32 rather than hash(): str hashes are salted per process
+    return zlib.crc32(str(external_id).encode("utf-8")) % partitions
+
+
+def _load_partitioned(run_id, batches, session, store, position, partitions):
+    """Hash-partition rows by external_id across one writer thread per
+    partition. Every writer has its own pooled connection and its own
+    ``LOAD:p<n>`` checkpoint, so partitions resume independently.
+
+    A chunk is checkpointed with the reader's position at the time it was
+    handed off, which is past every row of that partition read so far. On
+    resume extraction restarts at the least advanced partition and each
+    partition skips the rows its own checkpoint already covers; a row's
+    number is recovered from its place in the batch.
+
+    Lines transform rejected have no key to route by; partition 0 counts
+    them with its chunks and its checkpoint decides which are new.
+
+    Nothing is written on ``session`` until the final checkpoints, and the
+    transaction its reads opened is ended whenever chunks are handed off,
+    so it never sits idle in a transaction for the length of the load.
+    """
+    chunk_log = _chunk_log(run_id)
+    sizers = [_chunk_sizer(f"LOAD:p{p}", chunk_log) for p in range(partitions)]
+    done = [
+        Position.from_cursor(store.get(run_id, f"LOAD:p{p}")).rows
+        for p in range(partitions)
+    ]
+    quarantine = _quarantine(
+        run_id, [store.get(run_id, f"LOAD:p{p}:stats") for p in range(partitions)]
+    )
+    buffers = [[] for _ in range(partitions)]
+    lines = [[] for _ in range(partitions)]
+    rejected = [0] * partitions
+    chunks = [queue.Queue(maxsize=PARTITION_QUEUE_DEPTH) for _ in range(partitions)]
+    errors = []
+    session.commit()
+
+    workers = [
+        threading.Thread(
+            target=_partition_worker,
+            args=(run_id, p, chunks[p], sizers[p], quarantine, errors),
+            name=f"load-p{p}",
+            daemon=True,
+        )
+        for p in range(partitions)
+    ]
+    for worker in workers:
+        worker.start()
+
+    try:
+        for batch in batches:
+            if quarantine:
+                rejected[0] += _quarantine_lines(quarantine, batch, position, done[0])
+
+            for number, row in _numbered(batch, position.rows):
+                p = _partition_of(row.external_id, partitions)
+                if number > done[p]:
+                    buffers[p].append(row)
+                    lines[p].append(number)
+
+            if errors:
+                break
+            # the sizer is tuned by the partition's writer thread
+            for p, buffer in enumerate(buffers):
+                if len(buffer) >= sizers[p].size:
+                    chunks[p].put((buffer, position.to_cursor(), rejected[p], lines[p]))
+                    buffers[p] = []
+                    lines[p] = []
+                    rejected[p] = 0
+                    # extract may have read a checkpoint on this session
+                    session.commit()
+
+        for p, buffer in enumerate(buffers):
+            if (buffer or rejected[p]) and not errors:
+                chunks[p].put((buffer, position.to_cursor(), rejected[p], lines[p]))
+    finally:
+        for q in chunks:
+            q.put(None)
+        for worker in workers:
+            worker.join()
+        if chunk_log:
+            chunk_log.close()
+        if quarantine:
+            quarantine.close()
+
+    if errors:
+        raise errors[0]
+
+    # every partition has now seen the whole input, including the ones
+    # that received no rows since their last chunk
+    for p in range(partitions):
+        store.stage(run_id, f"LOAD:p{p}", position.to_cursor())
+    session.commit()
+
+    stats = LoadStats()
+    for p in range(partitions):
+        stats += LoadStats.from_cursor(store.get(run_id, f"LOAD:p{p}:stats"))
+    return stats
+
+
+def _partition_worker(run_id, partition, chunks, sizer, quarantine, errors):
+    session = Session()
+    writer = ChunkWriter(
+        run_id,
+        f"LOAD:p{partition}",
+        session,
+        CheckpointStore(session),
+        sizer,
+        quarantine,
+    )
+
+    try:
+        while True:
+            item = chunks.get()
+            if item is None:
+                writer.finish()
+                return
+
+            writer.write(*item)
+    except Exception as exc:
+        session.rollback()
+        errors.append(exc)
+        # keep draining so the reader never blocks on a dead partition
+        while chunks.get() is not None:
+            pass
+    finally:
+        session.close()
+
+
+def _flusher(mode):
+    try:
+        return FLUSHERS[mode]
+    except KeyError:
+        raise ValueError(
+            f"Unknown load mode {mode!r}, expected one of: {', '.join(FLUSHERS)}"
+        ) from None
+
+
+def _changed_only(mode):
+    if mode not in UPSERT_MODES:
+        raise ValueError(
+            f"Unknown upsert mode {mode!r}, expected one of: {', '.join(UPSERT_MODES)}"
+        )
+    return mode == "changed"
+
+
+# Every flusher returns (inserted, updated); rows in neither were unchanged.
+
+
+def _flush(rows, session, changed_only=False):
+    # Core binds multi-row VALUES by column name
+    stmt = insert(Customer).values([row._asdict() for row in rows])
+    where = None
+    if changed_only:
+        where = or_(
+            Customer.name.is_distinct_from(stmt.excluded.name),
+            Customer.email.is_distinct_from(stmt.excluded.email),
+            Customer.updated_at.is_distinct_from(stmt.excluded.updated_at),
+        )
     stmt = stmt.on_conflict_do_update(
         index_elements=["external_id"],
         set_={
@@ -31,6 +586,72 @@ def _flush(rows, session):
             "email": stmt.excluded.email,
             "updated_at": stmt.excluded.updated_at,
         },
+        where=where,
+    ).returning(literal_column("(xmax = 0)"))
+
+    flags = session.execute(stmt).scalars().all()
+    inserted = sum(flags)
+    return inserted, len(flags) - inserted
+
+
+def _flush_copy(rows, session, changed_only=False):
+    """Stream the chunk into a temp staging table with COPY, then merge it
+    into the target with a single set-based upsert."""
+    # raw psycopg2 connection bound to the session's current transaction
+    dbapi_conn = session.connection().connection.dbapi_connection
+
+    with dbapi_conn.cursor() as cur:
+        cur.execute(CREATE_STAGE_SQL)
+        cur.copy_expert(COPY_SQL, _copy_buffer(rows))
+        cur.execute(_MERGE_SQL[changed_only])
+        inserted, updated = cur.fetchone()
+        cur.execute(TRUNCATE_STAGE_SQL)
+
+    return inserted, updated
+
+
+def _flush_values(rows, session, changed_only=False):
+    """Send the chunk through psycopg2's execute_values.
+
+    The statement text is rendered once at import, so nothing is compiled
+    per chunk, and rows go out in pages of ``values_page_size`` whatever the
+    chunk size is; a short final chunk is just a short last page.
+    """
+    dbapi_conn = session.connection().connection.dbapi_connection
+
+    with dbapi_conn.cursor() as cur:
+        flags = execute_values(
+            cur,
+            _VALUES_SQL[changed_only],
+            rows.rows() if isinstance(rows, Columns) else rows,
+            template=VALUES_TEMPLATE,
+            page_size=settings.values_page_size,
+            fetch=True,
+        )
+
+    inserted = sum(1 for (is_new,) in flags if is_new)
+    return inserted, len(flags) - inserted
+
+
+def _copy_buffer(rows):
+    if isinstance(rows, Columns):
+        # escape column by column, then stitch the fields into lines
+        fields = [map(_copy_field, column) for column in rows.columns]
+        lines = map("\t".join, zip(*fields))
+        return io.StringIO("".join(line + "\n" for line in lines))
+    return io.StringIO(
+        "".join("\t".join(_copy_field(value) for value in row) + "\n" for row in rows)
     )
-    session.execute(stmt)
-    session.commit()
+
+
+def _copy_field(value):
+    if value is None:
+        return "\\N"
+    return str(value).translate(_COPY_ESCAPES)
+
+
+FLUSHERS = {
+    "insert": _flush,
+    "copy": _flush_copy,
+    "values": _flush_values,
+}
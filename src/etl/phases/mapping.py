@@ -0,0 +1,107 @@
+import hashlib
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple
+
+from etl.phases.records import Columns
+
+# names a spec may use, mapped to what the generated code calls
+CASTS = {"str": str, "int": int, "float": float, "bool": bool}
+NORMALIZERS = ("strip", "lstrip", "rstrip", "lower", "upper", "casefold", "title")
+
+
+@dataclass(frozen=True)
+class Field:
+    """One output field: read from ``source`` (default: the field's own
+    name) in the decoded JSON object, passed through ``cast`` and then
+    through each string method named in ``normalize``, in order."""
+
+    name: str
+    source: Optional[str] = None
+    cast: Optional[str] = None
+    normalize: Tuple[str, ...] = ()
+
+
+@dataclass(frozen=True)
+class Spec:
+    """How a pipeline maps decoded JSON objects onto ``record``, a
+    NamedTuple whose fields are ``fields`` in the same order."""
+
+    record: type
+    fields: Tuple[Field, ...]
+
+    def key(self) -> str:
+        record = f"{self.record.__module__}.{self.record.__qualname__}"
+        return hashlib.sha256(repr((record, self.fields)).encode()).hexdigest()
+
+
+_COMPILED: Dict[Tuple[str, bool], Callable] = {}
+
+
+def compile_spec(spec: Spec, columnar: bool = False) -> Callable:
+    """Return ``batch(lines, loads) -> [record, ...]`` for ``spec``, or
+    ``-> Columns`` when ``columnar``.
+
+    The function is generated as source, one list comprehension with every
+    lookup, cast and normalizer written out inline, so it runs as fast as a
+    hand-written loop. The columnar variant gathers each field into a list
+    and casts and normalizes it in one ``map`` over the column. Either is
+    built once per spec and cached by the spec's hash.
+    """
+    key = (spec.key(), columnar)
+    batch = _COMPILED.get(key)
+    if batch is None:
+        batch = _COMPILED[key] = _generate(spec, columnar)
+    return batch
+
+
+def _generate(spec: Spec, columnar: bool) -> Callable:
+    names = tuple(field.name for field in spec.fields)
+    if names != spec.record._fields:
+        raise ValueError(
+            f"Spec fields {names} do not match {spec.record.__name__} "
+            f"fields {spec.record._fields}"
+        )
+
+    namespace = {"_Record": spec.record, "_Columns": Columns}
+    args = []
+    for field in spec.fields:
+        expr = f"raw[{field.source or field.name!r}]"
+        if columnar:
+            expr = f"[{expr} for raw in raws]"
+        if field.cast is not None:
+            if field.cast not in CASTS:
+                raise ValueError(f"Unknown cast {field.cast!r} for {field.name!r}")
+            namespace[f"_cast_{field.cast}"] = CASTS[field.cast]
+            if columnar:
+                expr = f"map(_cast_{field.cast}, {expr})"
+            else:
+                expr = f"_cast_{field.cast}({expr})"
+        for method in field.normalize:
+            if method not in NORMALIZERS:
+                raise ValueError(f"Unknown normalizer {method!r} for {field.name!r}")
+            if columnar:
+                namespace[f"_str_{method}"] = getattr(str, method)
+                expr = f"map(_str_{method}, {expr})"
+            else:
+                expr = f"{expr}.{method}()"
+        if columnar and expr.startswith("map("):
+            expr = f"list({expr})"
+        args.append(expr)
+
+    if columnar:
+        columns = "".join(f"        {arg},\n" for arg in args)
+        source = (
+            "def batch(lines, loads):\n"
+            "    raws = list(map(loads, lines))\n"
+            f"    return _Columns(_Record, [\n{columns}    ])\n"
+        )
+    else:
+        source = (
+            "def batch(lines, loads):\n"
+            f"    return [_Record({', '.join(args)}) for raw in map(loads, lines)]\n"
+        )
+    code = compile(source, f"<spec {spec.record.__name__}>", "exec")
+    exec(code, namespace)
+    batch = namespace["batch"]
+    batch.source = source
+    return batch
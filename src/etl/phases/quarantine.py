@@ -0,0 +1,68 @@
+import json
+import threading
+from pathlib import Path
+
+
+class RejectBudgetExceeded(Exception):
+    pass
+
+
+class Quarantine:
+    """Dead-letter sink for rows that fail transform or the database.
+
+    Every reject is appended to ``path`` as one JSON object: the phase that
+    rejected it, why, where it came from and the row itself. Once more than
+    ``budget`` rows have been rejected over the run, ``already`` counting
+    the ones earlier attempts committed, RejectBudgetExceeded is raised and
+    the run fails as it would have on the first bad row. Safe to share
+    between writer threads.
+    """
+
+    def __init__(self, path: Path, budget: int, already: int = 0):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.budget = budget
+        self.already = already
+        self.count = 0
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def reject(self, phase, reason, position=None, row=None, payload=None):
+        """Record one bad row. ``position`` is the Position of the batch or
+        chunk it was in and ``row`` its line number, when known."""
+        entry = {
+            "phase": phase,
+            "reason": reason,
+            "source": position.source if position else None,
+            "member": position.member if position else None,
+            "row": row,
+            "payload": payload,
+        }
+        line = json.dumps(entry, default=str) + "\n"
+
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            self.count += 1
+            total = self.already + self.count
+
+        if total > self.budget:
+            raise RejectBudgetExceeded(
+                f"{total} rows rejected, more than the budget of {self.budget}; "
+                f"last: {reason} (see {self.path})"
+            )
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def reason(exc: Exception) -> str:
+    return f"{type(exc).__name__}: {exc}"
+
+
+def text(line) -> str:
+    """A raw input line as text for the dead-letter file."""
+    if isinstance(line, (bytes, bytearray, memoryview)):
+        return bytes(line).decode("utf-8", "replace")
+    return line
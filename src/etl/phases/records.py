@@ -0,0 +1,70 @@
+from typing import Any, NamedTuple, Optional
+
+
+class CustomerRecord(NamedTuple):
+    """One transformed customer row, fields in ``customer`` column order.
+
+    A tuple rather than a dict: a fraction of the memory per row, and the
+    database drivers bind it positionally as it is.
+    """
+
+    external_id: Any
+    name: Optional[str]
+    email: Optional[str]
+    updated_at: Any
+
+
+class Rows(list):
+    """A list of records that had lines of its input batch rejected on the
+    way: ``rejected`` holds an ``(index, reason, line)`` tuple for each,
+    ``index`` counting input lines, so row numbers can still be told."""
+
+    rejected = ()
+
+
+class Columns:
+    """A batch of records stored field-wise: ``columns[i]`` holds field
+    ``i`` of every record, in record order.
+
+    Four lists per batch instead of a tuple per row, so there is no
+    per-row object to allocate, and a normalization runs over a whole
+    column in one call. Iterating yields ``record`` instances, so code that
+    only needs rows can take either kind of batch. ``rejected`` is as on
+    Rows.
+    """
+
+    __slots__ = ("record", "columns", "rejected")
+
+    def __init__(self, record, columns, rejected=()):
+        self.record = record
+        self.columns = columns
+        self.rejected = rejected
+
+    def __len__(self):
+        return len(self.columns[0])
+
+    def __iter__(self):
+        return map(self.record._make, zip(*self.columns))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return Columns(self.record, [c[index] for c in self.columns])
+        return self.record._make(c[index] for c in self.columns)
+
+    def column(self, name):
+        return self.columns[self.record._fields.index(name)]
+
+    def rows(self):
+        """The records as plain tuples."""
+        return zip(*self.columns)
+
+    def take(self, indices):
+        """A new batch of the records at ``indices``, in that order."""
+        return Columns(self.record, [[c[i] for i in indices] for c in self.columns])
+
+    def copy(self):
+        return Columns(self.record, [list(c) for c in self.columns])
+
+    def extend(self, other):
+        for mine, theirs in zip(self.columns, other.columns):
+            mine.extend(theirs)
@@ -0,0 +1,294 @@
+import re
+import struct
+import zlib
+from pathlib import PurePosixPath
+from urllib.parse import urlparse
+
+from etl.config.settings import settings
+from etl.phases.extract import split_lines
+from etl.phases.fetch import CHUNK_SIZE, http_session
+
+ZIP_LOCAL_HEADER = b"PK\x03\x04"
+ZIP_CENTRAL_DIRECTORY = b"PK\x01\x02"
+ZIP_END_OF_CENTRAL_DIRECTORY = b"PK\x05\x06"
+ZIP64_END_OF_CENTRAL_DIRECTORY = b"PK\x06\x06"
+ZIP_DATA_DESCRIPTOR = b"PK\x07\x08"
+GZIP_MAGIC = b"\x1f\x8b"
+
+_LOCAL_HEADER = struct.Struct("<4sHHHHHIIIHH")
+_ZIP64_EXTRA_ID = 0x0001
+_FLAG_DATA_DESCRIPTOR = 0x08
+_STORED, _DEFLATED = 0, 8
+# where the local entries of a zip end
+_ZIP_DIRECTORY = (
+    ZIP_CENTRAL_DIRECTORY,
+    ZIP_END_OF_CENTRAL_DIRECTORY,
+    ZIP64_END_OF_CENTRAL_DIRECTORY,
+)
+
+_CONTENT_RANGE = re.compile(r"bytes \d+-(\d+)/")
+
+
+def stream_lines(run_id: str, url: str, store, position, session=None):
+    """Per-line adapter over ``stream_batches``, yielding ``str`` lines."""
+    batches = stream_batches(run_id, url, store, position, session, batch_lines=1)
+    for (line,) in batches:
+        yield line.decode("utf-8")
+
+
+def stream_batches(
+    run_id: str, url: str, store, position, session=None, batch_lines=None
+):
+    """Yield batches of lines decoded straight off the HTTP response, with
+    no archive written to disk. Batches are lists of up to ``batch_lines``
+    (default ``settings.batch_lines``) raw ``bytes`` lines, as
+    ``extract_batches`` produces them.
+
+    Handles a zip (read entry by entry from its local file headers, stored
+    or deflated), a gzip stream or plain NDJSON, detected from the first
+    bytes. ``position`` is advanced in place like ``extract`` does;
+    ``position.source_offset`` is where in the response body decoding can
+    restart: the line itself for NDJSON, the current entry's local header
+    for zip and the start of the body for gzip. A resume requests that
+    offset with ``Range`` and discards the decompressed bytes up to
+    ``position.offset`` without splitting them into lines.
+
+    A body cut short is an error, never a clean end: a zip must reach its
+    central directory, and NDJSON or gzip must run to the end the response
+    announced in Content-Length or Content-Range, which the HTTP client
+    does not check itself.
+    """
+    session = session or http_session(1)
+    batch_lines = batch_lines or settings.batch_lines
+    start = position.source_offset
+
+    headers = {"Range": f"bytes={start}-"} if start else {}
+    with session.get(
+        url, headers=headers, stream=True, timeout=settings.request_timeout
+    ) as r:
+        r.raise_for_status()
+        ranged = r.status_code == 206
+        chunks = r.iter_content(chunk_size=CHUNK_SIZE)
+        body = _ByteStream(chunks, start if ranged else 0)
+        end = _body_end(r, body.pos)
+        if start and not ranged:
+            body.skip(start)
+
+        head = body.peek(4)
+        if head in (ZIP_LOCAL_HEADER, ZIP_END_OF_CENTRAL_DIRECTORY):
+            yield from _zip_batches(body, position, batch_lines)
+        elif head.startswith(GZIP_MAGIC):
+            position.member = position.member or _name(url)
+            yield from _batches(
+                _gunzip(body, end), position, position.offset, batch_lines
+            )
+        else:
+            position.member = position.member or _name(url)
+            skip = position.offset - position.source_offset
+            yield from _batches(
+                _raw(body, end), position, skip, batch_lines, track_source=True
+            )
+
+
+def _zip_batches(body, position, batch_lines):
+    resume_member = position.member
+
+    while True:
+        entry_offset = body.pos
+        signature = body.peek(4)
+        if signature in _ZIP_DIRECTORY:
+            return
+        if len(signature) < 4:
+            raise EOFError(f"Zip ended at offset {entry_offset} before its directory")
+        if signature != ZIP_LOCAL_HEADER:
+            raise ValueError(
+                f"Bad zip record signature {signature!r} at offset {entry_offset}"
+            )
+
+        header = _LOCAL_HEADER.unpack(body.read(_LOCAL_HEADER.size))
+        _, _, flags, method, _, _, _, csize, _, name_len, extra_len = header
+        name = body.read(name_len).decode("utf-8")
+        zip64 = csize == 0xFFFFFFFF
+        csize = _zip64_size(body.read(extra_len), csize)
+
+        if flags & _FLAG_DATA_DESCRIPTOR and method == _STORED:
+            raise ValueError(f"Cannot stream stored zip entry {name!r}: size unknown")
+
+        if method == _DEFLATED:
+            data = _inflate(body, zlib.decompressobj(-zlib.MAX_WBITS))
+        elif method == _STORED:
+            data = _take(body, csize)
+        else:
+            raise ValueError(f"Unsupported zip compression {method} for {name!r}")
+
+        if name.endswith("/"):
+            for _ in data:
+                pass
+        else:
+            skip = 0
+            if name == resume_member:
+                skip = position.offset
+                resume_member = None
+            position.member = name
+            position.source_offset = entry_offset
+            position.offset = skip
+
+            yield from _batches(data, position, skip, batch_lines)
+
+        if flags & _FLAG_DATA_DESCRIPTOR:
+            if body.peek(4) == ZIP_DATA_DESCRIPTOR:
+                body.read(4)
+            # crc32 + sizes; zip64 sizes are 8 bytes each
+            body.read(20 if zip64 else 12)
+
+
+def _zip64_size(extra, csize):
+    if csize != 0xFFFFFFFF:
+        return csize
+    i = 0
+    while i + 4 <= len(extra):
+        field_id, size = struct.unpack_from("<HH", extra, i)
+        if field_id == _ZIP64_EXTRA_ID:
+            # uncompressed size comes first, then compressed
+            return struct.unpack_from("<QQ", extra, i + 4)[1]
+        i += 4 + size
+    return csize
+
+
+def _batches(pieces, position, skip, batch_lines, track_source=False):
+    """Split decompressed ``pieces`` into batches of lines, dropping the
+    first ``skip`` bytes unparsed. With ``track_source`` (uncompressed
+    input) the source offset follows every batch, so resume can seek to it
+    exactly."""
+    for lines, terminated in split_lines(_skipped(pieces, skip)):
+        for i in range(0, len(lines), batch_lines):
+            batch = lines[i : i + batch_lines]
+            position.offset += sum(map(len, batch))
+            if terminated:
+                position.offset += len(batch)
+            position.rows += len(batch)
+            if track_source:
+                position.source_offset = position.offset
+            yield batch
+
+
+def _skipped(pieces, skip):
+    for piece in pieces:
+        if skip:
+            if len(piece) <= skip:
+                skip -= len(piece)
+                continue
+            piece = piece[skip:]
+            skip = 0
+        yield piece
+
+
+def _gunzip(body, end=None):
+    # a .gz may hold several concatenated members
+    while body.peek(2) == GZIP_MAGIC:
+        yield from _inflate(body, zlib.decompressobj(16 + zlib.MAX_WBITS))
+    _check_end(body, end)
+
+
+def _inflate(body, decoder):
+    """Decompress from ``body`` until the compressed stream ends, handing
+    any bytes read past its end back to ``body``."""
+    while not decoder.eof:
+        data = body.read_some()
+        if not data:
+            raise EOFError("Compressed stream ended early")
+        out = decoder.decompress(data)
+        if out:
+            yield out
+    if decoder.unused_data:
+        body.unread(decoder.unused_data)
+
+
+def _take(body, size):
+    while size:
+        data = body.read_some(size)
+        if not data:
+            raise EOFError("Stored entry ended early")
+        size -= len(data)
+        yield data
+
+
+def _raw(body, end=None):
+    while True:
+        data = body.read_some()
+        if not data:
+            break
+        yield data
+    _check_end(body, end)
+
+
+def _body_end(r, start):
+    """The body offset the response announced it would end at, or None."""
+    if r.headers.get("Content-Encoding", "identity") != "identity":
+        # decoded on the way in, so the announced size is not what we read
+        return None
+    if r.status_code == 206:
+        m = _CONTENT_RANGE.match(r.headers.get("Content-Range", ""))
+        if m:
+            return int(m.group(1)) + 1
+    length = r.headers.get("Content-Length")
+    return start + int(length) if length is not None else None
+
+
+def _check_end(body, end):
+    # called as the input runs out, so it fails before ``split_lines`` hands
+    # out what is left as a last, partial line
+    if end is not None and body.pos != end:
+        raise EOFError(f"Response body stopped at byte {body.pos} of {end}")
+
+
+def _name(url):
+    return PurePosixPath(urlparse(url).path).name or url
+
+
+class _ByteStream:
+    """Buffered reader over an iterator of byte chunks; ``pos`` is the
+    absolute offset in the response body of the next byte returned."""
+
+    def __init__(self, chunks, pos=0):
+        self._chunks = iter(chunks)
+        self._buf = b""
+        self.pos = pos
+
+    def _fill(self, n):
+        while len(self._buf) < n:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return
+            self._buf += chunk
+
+    def peek(self, n):
+        self._fill(n)
+        return self._buf[:n]
+
+    def read(self, n):
+        self._fill(n)
+        if len(self._buf) < n:
+            raise EOFError(f"Expected {n} bytes at offset {self.pos}")
+        data, self._buf = self._buf[:n], self._buf[n:]
+        self.pos += n
+        return data
+
+    def read_some(self, limit=None):
+        if not self._buf:
+            self._buf = next(self._chunks, b"")
+        n = len(self._buf) if limit is None else min(limit, len(self._buf))
+        data, self._buf = self._buf[:n], self._buf[n:]
+        self.pos += n
+        return data
+
+    def unread(self, data):
+        self._buf = data + self._buf
+        self.pos -= len(data)
+
+    def skip(self, n):
+        while n:
+            data = self.read_some(n)
+            if not data:
+                raise EOFError("Body ended before the resume offset")
+            n -= len(data)
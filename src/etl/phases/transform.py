@@ -1,11 +1,160 @@
-import json
+import collections
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import replace
 
-def transform(lines):
+from etl.config.settings import settings
+from etl.phases.decoders import DECODE_ERRORS, decoder
+from etl.phases.mapping import compile_spec
+from etl.phases.quarantine import reason
+from etl.phases.records import Columns, Rows
+
+# what a line that is not a well-formed record makes the mapping raise
+ROW_ERRORS = DECODE_ERRORS + (KeyError, IndexError, TypeError, AttributeError)
+
+
+def transform(lines, spec=None):
+    """Per-line counterpart of ``transform_batch``."""
+    batch = compile_spec(spec or _default_spec())
+    loads = decoder(settings.json_decoder)
     for line in lines:
-        raw = json.loads(line)
-        yield {
-            "external_id": raw["id"],
-            "name": raw["name"].strip(),
-            "email": raw["email"].lower(),
-            "updated_at": raw["updated_at"],
-        }
+        yield batch([line], loads)[0]
+
+
+def transform_batches(batches, spec=None, columnar=None):
+    batch = _compiled(spec, columnar)
+    loads = decoder(settings.json_decoder)
+    for lines in batches:
+        yield batch(lines, loads)
+
+
+def transform_batch(lines, loads=None, spec=None, columnar=None):
+    """Map a batch of raw JSON lines (``bytes`` or ``str``) to records as
+    ``spec`` (default: the customers pipeline's) describes, one per line
+    and in the same order: a list of records, or one Columns batch when
+    ``columnar`` (default ``settings.columnar_batches``).
+
+    With ``settings.max_rejects`` set, lines that cannot be mapped are left
+    out and listed on the batch's ``rejected`` instead of failing it."""
+    batch = _compiled(spec, columnar)
+    return batch(lines, loads or decoder(settings.json_decoder))
+
+
+def _compiled(spec, columnar):
+    if columnar is None:
+        columnar = settings.columnar_batches
+    batch = compile_spec(spec or _default_spec(), columnar)
+    if settings.max_rejects:
+        return functools.partial(_checked, batch)
+    return batch
+
+
+def _checked(batch, lines, loads):
+    """``batch(lines, loads)``, except that a batch that fails is redone
+    line by line and the lines that fail on their own are set aside."""
+    try:
+        return batch(lines, loads)
+    except ROW_ERRORS:
+        pass
+
+    good = batch([], loads)
+    rejected = []
+    for i, line in enumerate(lines):
+        try:
+            good.extend(batch([line], loads))
+        except ROW_ERRORS as exc:
+            rejected.append((i, reason(exc), line))
+
+    if not isinstance(good, Columns):
+        good = Rows(good)
+    good.rejected = rejected
+    return good
+
+
+def _default_spec():
+    # imported here because the pipeline module imports this one
+    from etl.pipelines.customers import SPEC
+
+    return SPEC
+
+
+def transform_parallel(
+    batches, position, received, workers=None, spec=None, columnar=None
+):
+    """``transform_batches`` spread over a pool of ``workers`` processes
+    (default ``settings.transform_workers``), yielding in input order.
+
+    Consecutive batches are joined into tasks of at least
+    ``transform_task_lines`` lines so each round trip to a worker carries
+    enough work to pay for pickling it. At most two tasks per worker are in
+    flight, which bounds memory.
+
+    Reading ahead moves ``position``, the Position extract advances, past
+    rows that have not been yielded yet. ``received`` is therefore kept at
+    the snapshot taken after the last batch of the task being yielded:
+    that is the position load has to checkpoint. run_etl resumes from the
+    load checkpoint, never from where extract had got to.
+    """
+    workers = workers or settings.transform_workers
+    spec = spec or _default_spec()
+    if columnar is None:
+        columnar = settings.columnar_batches
+    task_lines = settings.transform_task_lines
+    ctx = multiprocessing.get_context("spawn")
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        pending = collections.deque()
+        lines = []
+
+        def submit():
+            future = pool.submit(
+                _transform_task,
+                lines,
+                spec,
+                columnar,
+                settings.json_decoder,
+                bool(settings.max_rejects),
+            )
+            pending.append((future, replace(position)))
+
+        def ready():
+            future, snapshot = pending.popleft()
+            result, rejected = future.result()
+            vars(received).update(vars(snapshot))
+            if columnar:
+                return Columns(spec.record, result, rejected)
+            rows = Rows(map(spec.record._make, result))
+            rows.rejected = rejected
+            return rows
+
+        try:
+            for batch in batches:
+                lines.extend(batch)
+                if len(lines) < task_lines:
+                    continue
+
+                submit()
+                lines = []
+                if len(pending) >= 2 * workers:
+                    yield ready()
+
+            if lines:
+                submit()
+            while pending:
+                yield ready()
+        finally:
+            # a consumer that stops early should not wait for read-ahead
+            for future, _ in pending:
+                future.cancel()
+
+
+def _transform_task(lines, spec, columnar, decoder_name, checked):
+    batch = compile_spec(spec, columnar)
+    loads = decoder(decoder_name)
+    batch = _checked(batch, lines, loads) if checked else batch(lines, loads)
+    rejected = list(getattr(batch, "rejected", ()))
+    if columnar:
+        return batch.columns, rejected
+    # plain tuples pickle several times faster than NamedTuple instances
+    return list(map(tuple, batch)), rejected
@@ -1,8 +1,20 @@
 from etl.phases import download, extract, transform, load
+from etl.phases.mapping import Field, Spec
+from etl.phases.records import CustomerRecord
+
+SPEC = Spec(
+    CustomerRecord,
+    (
+        Field("external_id", source="id"),
+        Field("name", normalize=("strip",)),
+        Field("email", normalize=("lower",)),
+        Field("updated_at"),
+    ),
+)
 
 PIPELINE = [
-    ("DOWNLOAD", download.run),
-    ("EXTRACT", extract.run),
-    ("TRANSFORM", transform.run),
-    ("LOAD", load.run),
+    ("DOWNLOAD", download.download),
+    ("EXTRACT", extract.extract_batches),
+    ("TRANSFORM", transform.transform_batches),
+    ("LOAD", load.load_batches),
 ]
@@ -1,13 +1,17 @@
+from etl.config.settings import settings
 from etl.db.database import Session
 from etl.metadata.run_store import RunStore
 from etl.metadata.checkpoint_store import CheckpointStore
-from etl.phases.download import download
-from etl.phases.extract import extract
-from etl.phases.transform import transform
-from etl.phases.load import load
+from etl.phases.download import download, download_all, load_manifest
+from etl.phases.extract import extract_all, extract_batches
+from etl.phases.transform import transform_batches, transform_parallel
+from etl.phases.load import load_batches, resume_position
+from etl.phases.stream import stream_batches
+from etl.pipelines.customers import SPEC
 
 import sys
 import sqlalchemy
+from dataclasses import replace
 
 # def run_etl(run_id: str, pipeline_name: str):
 #     pipeline = load_pipeline(pipeline_name)
@@ -32,17 +36,50 @@ def run_etl(run_id: str):
             )
             return
 
-        run_store.set_phase(run_id, "DOWNLOAD")
-        zip_path = download(run_id, checkpoint)
+        position = resume_position(run_id, checkpoint)
 
-        run_store.set_phase(run_id, "EXTRACT")
-        lines = extract(run_id, zip_path, checkpoint)
+        # extract, transform and load run lazily in lockstep, batch by batch:
+        # the position extract advances is exactly what load has received
+        if settings.ingest_mode == "stream":
+            run_store.set_phase(run_id, "EXTRACT")
+            line_batches = stream_batches(
+                run_id, settings.source_url, checkpoint, position
+            )
+        elif settings.source_manifest:
+            run_store.set_phase(run_id, "DOWNLOAD")
+            sources = load_manifest(settings.source_manifest)
+            archives = download_all(run_id, sources, checkpoint)
+
+            run_store.set_phase(run_id, "EXTRACT")
+            line_batches = extract_all(run_id, archives, checkpoint, position)
+        else:
+            run_store.set_phase(run_id, "DOWNLOAD")
+            zip_path = download(run_id, checkpoint)
+
+            run_store.set_phase(run_id, "EXTRACT")
+            line_batches = extract_batches(run_id, zip_path, checkpoint, position)
 
         run_store.set_phase(run_id, "TRANSFORM")
-        rows = transform(lines)
+        if settings.transform_workers > 1:
+            # transform reads ahead; load checkpoints what it has received
+            received = replace(position)
+            row_batches = transform_parallel(
+                line_batches, position, received, spec=SPEC
+            )
+        else:
+            received = position
+            row_batches = transform_batches(line_batches, SPEC)
 
         run_store.set_phase(run_id, "LOAD")
-        load(run_id, rows, session, checkpoint)
+        stats = load_batches(run_id, row_batches, session, checkpoint, received)
+        run_store.set_counts(
+            run_id,
+            stats.inserted,
+            stats.updated,
+            stats.skipped,
+            stats.duplicates,
+            stats.rejected,
+        )
 
         run_store.complete(run_id)
 
@@ -50,6 +87,10 @@ def run_etl(run_id: str):
         # run_store.fail(run_id, str(exc))
         # Try to record the failure in the DB, but don't allow DB errors here to explode
         try:
+            # drop what the failed attempt left uncommitted, such as rows
+            # flushed under a chunk's savepoints, before committing the
+            # failure on the same session
+            session.rollback()
             run_store.fail(run_id, str(exc))
         except sqlalchemy.exc.SQLAlchemyError as db_exc:
             print(
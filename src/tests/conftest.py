@@ -0,0 +1,47 @@
+import os
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# etl.config.settings reads the environment, and databases.yaml, as soon as
+# it is imported, before any fixture can run; nothing here connects to a
+# database, and nothing is written into the source tree
+_TEMP_DIR = Path(tempfile.mkdtemp(prefix="etl-tests-"))
+_DATABASES_YAML = _TEMP_DIR / "databases.yaml"
+_DATABASES_YAML.write_text("{}\n")
+
+os.environ.setdefault("ETL_DATABASE_URL", "postgresql+psycopg2://etl@localhost/etl")
+os.environ.setdefault("ETL_TEMP_DIR", str(_TEMP_DIR))
+os.environ.setdefault("ETL_CHUNK_SIZE", "1000")
+os.environ.setdefault("ETL_DATABASES_YAML", str(_DATABASES_YAML))
+
+
+class MemoryStore:
+    """CheckpointStore stand-in: ``set`` is committed at once, ``stage``
+    only once ``commit`` is called."""
+
+    def __init__(self, cursors=None):
+        self.committed = dict(cursors or {})
+        self.staged = []
+        self._pending = {}
+
+    def get(self, run_id, phase):
+        return self._pending.get(phase, self.committed.get(phase))
+
+    def set(self, run_id, phase, cursor):
+        self.stage(run_id, phase, cursor)
+        self.commit()
+
+    def stage(self, run_id, phase, cursor):
+        self.staged.append((phase, cursor))
+        self._pending[phase] = cursor
+
+    def commit(self):
+        self.committed.update(self._pending)
+        self._pending.clear()
+
+
+@pytest.fixture
+def store():
+    return MemoryStore()
@@ -0,0 +1,149 @@
+import gzip
+import random
+import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+
+import pytest
+from conftest import MemoryStore
+
+from etl.config.settings import settings
+from etl.phases import block_format, extract
+from etl.phases.extract import Position, extract_blocks
+
+# the block grammar as the single-pass extractor parsed whole files with it
+PREAMBLE = re.compile(
+    r"(?m)\A(?P<fileline>\d+[^\S\r\n]+[^\r\n]+)\r?\n"
+    r"(?P<comments>(?:\*[^\r\n]*\r?\n)*)"
+)
+BLOCK = re.compile(
+    r"(?m)^(?P<top>\d+\t[^\r\n]*)\r?\n"
+    r"(?P<header>\*[^\r\n]*)\r?\n"
+    r"(?P<content>(?:\t[^\r\n]*\r?\n)+)"
+    r"(?=0\r?\n\*\r?\n)"
+)
+
+
+def _reference(text):
+    m = PREAMBLE.search(text)
+    return [
+        (m["top"], m["header"], [line[1:] for line in m["content"].splitlines()])
+        for m in BLOCK.finditer(text, m.end() if m else 0)
+    ]
+
+
+def _generate(rng):
+    """A file of blocks, stray lines, unclosed blocks and lone sentinels,
+    LF or CRLF, with or without a preamble and a final newline."""
+    out = []
+    if rng.random() < 0.7:
+        out += ["12 file line"] + [f"*c{i}" for i in range(rng.randint(0, 3))]
+    for _ in range(rng.randint(0, 30)):
+        k = rng.random()
+        if k < 0.6:
+            out += [f"{rng.randint(0, 99)}\ttop", "*hdr" + rng.choice(["", " x"])]
+            out += [f"\tc{i} é" for i in range(rng.randint(1, 4))]
+            if rng.random() < 0.85:
+                out += ["0", "*"]
+        elif k < 0.8:
+            out.append(rng.choice(["0", "*", "garbage", "5\tx", "\tt"]))
+        else:
+            out += ["0", "*"]
+    newline = "\r\n" if rng.random() < 0.3 else "\n"
+    return newline.join(out) + (newline if rng.random() < 0.9 else "")
+
+
+def _blocks(path, position, seen=None):
+    blocks = []
+    for batch in extract_blocks("r", path, MemoryStore(), position):
+        blocks.extend(map(tuple, batch))
+        if seen is not None:
+            seen.append(replace(position))
+    return blocks
+
+
+@pytest.fixture
+def small(monkeypatch):
+    monkeypatch.setattr(settings, "batch_lines", 3)
+    monkeypatch.setattr(extract, "READ_SIZE", 7)
+    monkeypatch.setattr(extract, "BLOCK_RANGE_BYTES", 40)
+
+
+class _ThreadPool(ThreadPoolExecutor):
+    def __init__(self, workers, mp_context=None):
+        super().__init__(workers)
+
+
+def _check(path, text, resume_all=True):
+    position = Position()
+    seen = []
+    expected = _reference(text)
+
+    assert _blocks(path, position, seen) == expected
+    assert position.rows == len(expected)
+
+    # load checkpoints the position after any batch it commits
+    for resumed in seen if resume_all else seen[:1]:
+        rows = resumed.rows
+        assert _blocks(path, resumed) == expected[rows:]
+
+
+def test_streaming_parse_matches_reference(tmp_path, small):
+    rng = random.Random(1)
+    for i in range(400):
+        text = _generate(rng)
+        path = tmp_path / "blocks.txt"
+        path.write_bytes(text.encode())
+        if i % 3 == 0:
+            path = tmp_path / "blocks.gz"
+            path.write_bytes(gzip.compress(text.encode()))
+        _check(path, text)
+
+
+def test_range_split_matches_reference(tmp_path, small, monkeypatch):
+    # ranges parsed on threads, so that hundreds of files stay fast
+    monkeypatch.setattr(extract, "ProcessPoolExecutor", _ThreadPool)
+    monkeypatch.setattr(settings, "extract_workers", 3)
+    rng = random.Random(2)
+    for _ in range(400):
+        text = _generate(rng)
+        path = tmp_path / "blocks.txt"
+        path.write_bytes(text.encode())
+        _check(path, text)
+
+
+def test_worker_processes_match_reference(tmp_path, small, monkeypatch):
+    monkeypatch.setattr(settings, "extract_workers", 3)
+    rng = random.Random(3)
+    for _ in range(2):
+        text = _generate(rng)
+        path = tmp_path / "blocks.txt"
+        path.write_bytes(text.encode())
+        _check(path, text, resume_all=False)
+
+
+def test_regions_end_past_sentinels():
+    rng = random.Random(4)
+    for _ in range(400):
+        data = _generate(rng).encode()
+        chunks, i = [], 0
+        while i < len(data):
+            size = rng.randint(0, 9)
+            chunks.append(data[i : i + size])
+            i += size
+        # sentinels may overlap: "\n0\n*\n0\n*\n" holds two
+        ends = set()
+        for i in range(len(data)):
+            m = block_format.SENTINEL.match(data, i)
+            if m:
+                ends.add(m.end())
+
+        regions = list(block_format.regions(chunks))
+
+        assert b"".join(regions) == data
+        assert all(regions)
+        # every region but the last stops just past a sentinel
+        end = 0
+        for region in regions[:-1]:
+            end += len(region)
+            assert end in ends
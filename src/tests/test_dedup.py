@@ -0,0 +1,53 @@
+import pytest
+
+from etl.phases.dedup import dedup
+from etl.phases.records import Columns, CustomerRecord
+
+
+def _rows(*pairs):
+    return [
+        CustomerRecord(key, f"n{i}", None, updated_at)
+        for i, (key, updated_at) in enumerate(pairs)
+    ]
+
+
+def _columnar(rows):
+    return Columns(CustomerRecord, [list(c) for c in zip(*rows)])
+
+
+def _kept(rows, columnar):
+    batch = _columnar(rows) if columnar else rows
+    kept, dropped = dedup(batch)
+    if columnar:
+        assert isinstance(kept, Columns)
+    assert dropped == len(rows) - len(kept)
+    return {row.external_id: row.name for row in kept}
+
+
+@pytest.mark.parametrize("columnar", [False, True])
+@pytest.mark.parametrize(
+    "first, second, winner",
+    [
+        # as text "2024-01-01T09:00:00Z" sorts after the later time
+        ("2024-01-01T09:00:00Z", "2024-01-01T10:00:00+00:00", "n2"),
+        ("2024-01-01T10:00:00+00:00", "2024-01-01T09:00:00Z", "n0"),
+        # the same instant in two zones is a tie: the later row wins
+        ("2024-01-01T12:00:00+02:00", "2024-01-01T10:00:00Z", "n2"),
+        ("2024-01-01T10:00:00.500", "2024-01-01T10:00:00", "n0"),
+        ("2024-01-01T10:00:00", "2024-01-01T10:00:00", "n2"),
+        (None, "2024-01-01T10:00:00", "n2"),
+        ("2024-01-01T10:00:00", None, "n0"),
+        (None, None, "n2"),
+        ("not a time", "2024-01-01T10:00:00", "n2"),
+    ],
+)
+def test_latest_update_wins(columnar, first, second, winner):
+    rows = _rows(("a", first), ("b", None), ("a", second))
+    assert _kept(rows, columnar) == {"a": winner, "b": "n1"}
+
+
+@pytest.mark.parametrize("columnar", [False, True])
+def test_unique_batch_is_returned_as_is(columnar):
+    rows = _rows(("a", None), ("b", "2024-01-01"))
+    batch = _columnar(rows) if columnar else rows
+    assert dedup(batch) == (batch, 0)
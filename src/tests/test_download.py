@@ -0,0 +1,171 @@
+import hashlib
+import http.server
+import json
+import threading
+
+import pytest
+
+from etl.config.settings import settings
+from etl.phases.download import _record, _reusable
+from etl.phases.download_cache import DownloadCache, link_into
+from etl.phases.fetch import file_digest
+
+URL = "http://example.com/customers.zip"
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    """Serves ``server.files[path]`` under its ETag, answering a matching
+    If-None-Match with 304 and honouring Range; ``server.sent`` collects the
+    path, status and body size of each response."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        data, etag = self.server.files[self.path]
+        if self.headers.get("If-None-Match") == etag:
+            status, body = 304, b""
+        elif self.headers.get("Range"):
+            first, last = self.headers["Range"].split("=")[1].split("-")
+            first, last = int(first), int(last) if last else len(data) - 1
+            status, body = 206, data[first : last + 1]
+        else:
+            status, body = 200, data
+        self.server.sent.append((self.path, status, len(body)))
+        self.send_response(status)
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {first}-{last}/{len(data)}")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    server.files = {}
+    server.sent = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = f"http://127.0.0.1:{server.server_port}"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _bodies(server):
+    # responses that carried more than a one-byte probe
+    return [path for path, _, size in server.sent if size > 1]
+
+
+def test_unrecorded_file_is_fetched_again(store, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "download_cache", False)
+    # left by a download from before they were written atomically
+    path = tmp_path / "r.zip"
+    path.write_bytes(b"PK\x03\x04 truncated")
+
+    assert not _reusable("r", "DOWNLOAD", URL, path, store)
+    assert not path.exists()
+
+
+def test_recorded_file_is_reused(store, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "download_cache", False)
+    path = tmp_path / "r.zip"
+    path.write_bytes(b"data")
+    _record("r", "DOWNLOAD", URL, path, file_digest(path), store)
+
+    assert _reusable("r", "DOWNLOAD", URL, path, store)
+
+
+def test_damaged_cached_copy_leaves_the_cache(store, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "download_cache", True)
+    monkeypatch.setattr(settings, "temp_dir", tmp_path)
+    cache = DownloadCache(tmp_path / "cache", 0)
+    data = b"data"
+    digest = hashlib.sha256(data).hexdigest()
+    blob = cache.blobs / digest
+    blob.write_bytes(data)
+    cache.index_path.write_text(
+        json.dumps({URL: {"sha256": digest, "size": 4, "last_used": 0}})
+    )
+    path = tmp_path / "r.zip"
+    link_into(blob, path)
+    _record("r", "DOWNLOAD", URL, path, file_digest(path), store)
+
+    # the run's file is the blob itself, so this damages both
+    path.write_bytes(b"dat!")
+
+    assert not _reusable("r", "DOWNLOAD", URL, path, store)
+    assert not blob.exists()
+    assert json.loads(cache.index_path.read_text()) == {}
+
+
+def test_unchanged_source_is_revalidated_not_fetched(server, tmp_path):
+    server.files["/a"] = (b"a" * 100, '"1"')
+    cache = DownloadCache(tmp_path, 0)
+    blob = cache.fetch(server.url + "/a")
+    server.sent.clear()
+
+    assert cache.fetch(server.url + "/a") == blob
+    assert server.sent == [("/a", 304, 0)]
+    assert blob.read_bytes() == b"a" * 100
+
+
+def test_changed_source_replaces_its_copy(server, tmp_path):
+    server.files["/a"] = (b"a" * 100, '"1"')
+    cache = DownloadCache(tmp_path, 0)
+    old = cache.fetch(server.url + "/a")
+    server.files["/a"] = (b"b" * 100, '"2"')
+
+    blob = cache.fetch(server.url + "/a")
+
+    assert blob.read_bytes() == b"b" * 100
+    entry = json.loads(cache.index_path.read_text())[server.url + "/a"]
+    assert (entry["etag"], entry["sha256"]) == ('"2"', blob.name)
+    # its blob stays until eviction, as a run may still be reading it
+    assert old.exists()
+
+
+def test_least_recently_used_is_evicted(server, tmp_path):
+    for name in "abc":
+        server.files[f"/{name}"] = (name.encode() * 100, f'"{name}"')
+    cache = DownloadCache(tmp_path, 250)
+    a = cache.fetch(server.url + "/a")
+    b = cache.fetch(server.url + "/b")
+    # using a makes b the oldest
+    cache.fetch(server.url + "/a")
+
+    c = cache.fetch(server.url + "/c")
+
+    assert a.exists() and c.exists() and not b.exists()
+    assert sorted(json.loads(cache.index_path.read_text())) == [
+        server.url + "/a",
+        server.url + "/c",
+    ]
+    server.sent.clear()
+    assert cache.fetch(server.url + "/b").read_bytes() == b"b" * 100
+    assert _bodies(server) == ["/b"]
+
+
+def test_entry_evicted_by_another_run_is_fetched(server, tmp_path, monkeypatch):
+    server.files["/a"] = (b"a" * 100, '"1"')
+    cache = DownloadCache(tmp_path, 0)
+    blob = cache.fetch(server.url + "/a")
+    revalidate = cache._revalidate
+
+    def evicted_meanwhile(session, url, entry):
+        validators = revalidate(session, url, entry)
+        if entry is not None:
+            DownloadCache(tmp_path, 0).discard(url)
+        return validators
+
+    monkeypatch.setattr(cache, "_revalidate", evicted_meanwhile)
+    server.sent.clear()
+
+    assert cache.fetch(server.url + "/a") == blob
+    assert blob.read_bytes() == b"a" * 100
+    assert _bodies(server) == ["/a"]
@@ -0,0 +1,152 @@
+import bz2
+import gzip
+import io
+import lzma
+import tarfile
+import zipfile
+from dataclasses import replace
+
+import pytest
+
+from etl.phases import formats
+from etl.phases.extract import Position, extract_batches, extract_blocks
+from etl.phases.formats import Format
+
+LINES = b"".join(b'{"n": %d}\n' % i for i in range(5))
+BLOCKS = b"12 file line\n1\ttop\n*hdr\n\tc\n0\n*\n"
+
+
+def _lines(path, n):
+    path.write_bytes(b"".join(b'{"n": %d}\n' % i for i in range(n)))
+    return path
+
+
+def test_resumes_from_any_batch(tmp_path, store):
+    path = _lines(tmp_path / "in.ndjson", 25)
+    position = Position()
+    seen = []
+    for batch in extract_batches("r", path, store, position, batch_lines=5):
+        seen.append((batch, replace(position)))
+    lines = [line for batch, _ in seen for line in batch]
+
+    assert len(lines) == 25
+    for _, at in seen:
+        rest = extract_batches("r", path, store, replace(at), batch_lines=5)
+        assert [line for batch in rest for line in batch] == lines[at.rows :]
+
+
+def test_position_round_trips():
+    position = Position("a.zip", "part-1.ndjson", 4096, 120, 2048)
+    assert Position.from_cursor(position.to_cursor()) == position
+
+
+def test_legacy_external_id_cursor_restarts():
+    # LOAD cursors used to be the last external_id loaded
+    assert Position.from_cursor("cust-000123") == Position()
+    assert Position.from_cursor("123") == Position()
+    assert Position.from_cursor('"123"') == Position()
+
+
+def _zip(data):
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("a.ndjson", data)
+    return out.getvalue()
+
+
+def _empty_zip(data):
+    out = io.BytesIO()
+    zipfile.ZipFile(out, "w").close()
+    return out.getvalue()
+
+
+def _tar(data):
+    out = io.BytesIO()
+    with tarfile.open(fileobj=out, mode="w") as tar:
+        info = tarfile.TarInfo("a.ndjson")
+        info.size = len(data)
+        tar.addfile(info, io.BytesIO(data))
+    return out.getvalue()
+
+
+def _zstd(data):
+    return formats.zstandard.ZstdCompressor().compress(data)
+
+
+def _plain(data):
+    return data
+
+
+zstd = pytest.mark.skipif(formats.zstandard is None, reason="zstandard missing")
+
+
+@pytest.mark.parametrize(
+    "encode, name, tar, lines",
+    [
+        (_zip, "zip", None, 5),
+        (_empty_zip, "zip", None, 0),
+        (gzip.compress, "gzip", False, 5),
+        (bz2.compress, "bzip2", False, 5),
+        (lzma.compress, "xz", False, 5),
+        pytest.param(_zstd, "zstd", False, 5, marks=zstd),
+        (lambda d: gzip.compress(_tar(d)), "gzip", True, 5),
+        (lambda d: lzma.compress(_tar(d)), "xz", True, 5),
+        (_tar, "plain", True, 5),
+        (_plain, "plain", False, 5),
+        # nothing to recognise: read as plain text
+        (lambda d: b"", "plain", False, 0),
+        (lambda d: b"PK", "plain", False, 1),
+        (lambda d: b"\x1f\n" + d, "plain", False, 6),
+    ],
+)
+def test_format_detection(tmp_path, store, encode, name, tar, lines):
+    path = tmp_path / "source"
+    path.write_bytes(encode(LINES))
+    fmt = formats.detect(path)
+
+    assert fmt.name == name
+    if tar is not None:
+        with open(path, "rb") as raw:
+            stream, is_tar = formats.open_stream(raw, fmt)
+            stream.close()
+        assert is_tar is tar
+    batches = extract_batches("r", path, store, batch_lines=2)
+    assert sum(map(len, batches)) == lines
+
+
+@pytest.mark.parametrize(
+    "encode, refused",
+    [
+        (_plain, None),
+        (gzip.compress, None),
+        (_zip, "zip archive"),
+        (lambda d: gzip.compress(_tar(d)), "tar archive"),
+    ],
+)
+def test_block_file_formats(tmp_path, store, encode, refused):
+    path = tmp_path / "blocks"
+    path.write_bytes(encode(BLOCKS))
+    blocks = extract_blocks("r", path, store)
+
+    if refused:
+        with pytest.raises(ValueError, match=refused):
+            list(blocks)
+    else:
+        assert [len(batch) for batch in blocks] == [1]
+
+
+def test_formats_are_tried_in_registration_order(tmp_path, monkeypatch):
+    monkeypatch.setattr(formats, "FORMATS", list(formats.FORMATS))
+    formats.register(Format("first", b"\x00\x01", lambda f: f))
+    # a later, longer magic does not shadow an earlier match
+    formats.register(Format("gzip-ish", b"\x1f\x8b\x08", lambda f: f))
+    formats.register(Format("second", b"\x00\x01\x02", lambda f: f))
+    path = tmp_path / "source"
+
+    for data, name in [
+        (b"\x00\x01\x02\x03", "first"),
+        (gzip.compress(LINES), "gzip"),
+        (b"\x00\x02", "plain"),
+    ]:
+        path.write_bytes(data)
+        assert formats.detect(path).name == name
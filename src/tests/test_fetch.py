@@ -0,0 +1,168 @@
+import hashlib
+import http.server
+import os
+import threading
+
+import pytest
+import requests
+
+from etl.phases import fetch as fetch_module
+from etl.phases.fetch import _fetch_range, fetch, http_session
+
+
+class RangeHandler(http.server.BaseHTTPRequestHandler):
+    """Serves ``server.data`` with its ETag, honouring Range and If-Range.
+    With ``server.cut`` set, ranged responses stop after half their body;
+    with ``server.short`` they announce and send only that half.
+    Connections are kept alive; ``server.peers`` collects their ports."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        data = server.data
+        requested = self.headers.get("Range")
+        server.ranges.append(requested)
+        server.peers.add(self.client_address[1])
+
+        if_range = self.headers.get("If-Range")
+        if requested and (if_range is None or if_range == server.etag):
+            first, last = requested.split("=")[1].split("-")
+            first, last = int(first), int(last) if last else len(data) - 1
+            body = data[first : last + 1]
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {first}-{last}/{len(data)}")
+        else:
+            body = data
+            self.send_response(200)
+        if server.short and len(body) > 1:
+            body = body[: len(body) // 2]
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", server.etag)
+        self.end_headers()
+
+        if server.cut and len(body) > 1:
+            self.wfile.write(body[: len(body) // 2])
+            self.close_connection = True
+        else:
+            self.wfile.write(body)
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    # so that an interrupted response leaves part of its body on disk
+    monkeypatch.setattr(fetch_module, "CHUNK_SIZE", 4096)
+
+
+@pytest.fixture
+def server():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+    server.daemon_threads = True
+    server.data = os.urandom(100_003)
+    server.etag = '"v1"'
+    server.cut = False
+    server.short = False
+    server.ranges = []
+    server.peers = set()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = f"http://127.0.0.1:{server.server_port}/data.zip"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _interrupted(server, target, segments):
+    server.cut = True
+    with pytest.raises((requests.RequestException, IOError)):
+        fetch(server.url, target, segments=segments, session=http_session(segments))
+    server.cut = False
+    server.ranges.clear()
+
+
+def _check(server, target, digest):
+    assert target.read_bytes() == server.data
+    assert digest.sha256 == hashlib.sha256(server.data).hexdigest()
+    assert [p.name for p in target.parent.iterdir()] == [target.name]
+
+
+def test_segments_resume(server, tmp_path):
+    target = tmp_path / "run.zip"
+    _interrupted(server, target, 4)
+
+    digest = fetch(server.url, target, segments=4, session=http_session(4))
+
+    _check(server, target, digest)
+    # every segment picked up past what it already had
+    ranges = sorted(int(r[6:].split("-")[0]) for r in server.ranges[1:])
+    assert len(ranges) == 4
+    bounds = [100_003 * i // 4 for i in range(4)]
+    assert all(first > start for first, start in zip(ranges, bounds))
+
+
+def test_short_range_is_kept_for_resume(server, tmp_path):
+    # a body that ends early but cleanly, as urllib3 1.x reports a dropped
+    # connection
+    target = tmp_path / "run.zip"
+    server.short = True
+    with pytest.raises(IOError, match="bytes at offset"):
+        fetch(server.url, target, segments=4, session=http_session(4))
+    server.short = False
+
+    parts = sorted(p.name for p in tmp_path.glob("run.zip.part-*"))
+    assert len(parts) == 4
+    assert not (tmp_path / "run.zip.part").exists()
+
+    server.ranges.clear()
+    digest = fetch(server.url, target, segments=4, session=http_session(4))
+
+    _check(server, target, digest)
+    assert all(not r.startswith("bytes=0-") for r in server.ranges[1:])
+
+
+@pytest.mark.parametrize("before, after", [(4, 2), (2, 4)])
+def test_segment_count_change(server, tmp_path, before, after):
+    target = tmp_path / "run.zip"
+    _interrupted(server, target, before)
+
+    digest = fetch(server.url, target, segments=after, session=http_session(after))
+
+    _check(server, target, digest)
+
+
+def test_upstream_change_discards_parts(server, tmp_path):
+    target = tmp_path / "run.zip"
+    _interrupted(server, target, 4)
+    server.data = os.urandom(len(server.data))
+    server.etag = '"v2"'
+
+    digest = fetch(server.url, target, segments=4, session=http_session(4))
+
+    _check(server, target, digest)
+
+
+def test_change_during_download_is_refused(server, tmp_path):
+    path = tmp_path / "run.zip.part-0-99"
+    with pytest.raises(IOError, match="changed"):
+        _fetch_range(http_session(1), server.url, path, 0, 100, True, validator='"v0"')
+
+
+def test_probe_connection_is_reused(server, tmp_path):
+    fetch(server.url, tmp_path / "run.zip", session=http_session(1))
+
+    assert len(server.ranges) == 2
+    assert len(server.peers) == 1
+
+
+def test_each_host_keeps_its_pool(server, tmp_path):
+    session = http_session(1, hosts=2)
+    urls = [server.url, server.url.replace("127.0.0.1", "localhost")]
+
+    for i in range(6):
+        fetch(urls[i % 2], tmp_path / f"{i}.zip", session=session)
+
+    assert len(server.ranges) == 12
+    assert len(server.peers) == 2
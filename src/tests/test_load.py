@@ -0,0 +1,107 @@
+import contextlib
+import json
+
+import psycopg2
+import pytest
+
+from etl.config.settings import settings
+from etl.phases import load
+from etl.phases.extract import Position
+from etl.phases.load import _partition_count, resume_position
+from etl.phases.records import Columns, CustomerRecord, Rows
+
+
+def test_serial_count_is_pinned(store, monkeypatch):
+    monkeypatch.setattr(settings, "load_workers", 1)
+    assert _partition_count("r", store) == 1
+
+    monkeypatch.setattr(settings, "load_workers", 4)
+    assert _partition_count("r", store) == 1
+
+
+def test_unpinned_serial_attempt_resumes_serially(store, monkeypatch):
+    # a serial attempt from before serial counts were pinned
+    store.set("r", "LOAD", Position(rows=500_000).to_cursor())
+    monkeypatch.setattr(settings, "load_workers", 4)
+
+    assert resume_position("r", store) == Position(rows=500_000)
+    assert store.get("r", "LOAD:partitions") == "1"
+
+
+def test_partitioned_count_is_pinned(store, monkeypatch):
+    monkeypatch.setattr(settings, "load_workers", 3)
+    assert _partition_count("r", store) == 3
+
+    monkeypatch.setattr(settings, "load_workers", 1)
+    assert _partition_count("r", store) == 3
+
+
+class FakeSession:
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+    @contextlib.contextmanager
+    def begin_nested(self):
+        yield
+
+
+def _flush(rows, session, changed_only=False):
+    if any(row.email == "bad" for row in rows):
+        raise psycopg2.DataError("bad email")
+    return len(rows), 0
+
+
+def _record(line, email="e", updated_at="2024-01-02"):
+    return CustomerRecord(str(line), "n", email, updated_at)
+
+
+def _batches(position, columnar):
+    # line 3 failed transform; line 7 is an older copy of line 8's row
+    first = Rows([_record(1), _record(2), _record(4), _record(5)])
+    first.rejected = [(2, "JSONDecodeError", b"{")]
+    second = Rows(
+        [
+            _record(6),
+            CustomerRecord("8", "n", "e", "2024-01-01"),
+            _record(8, email="bad"),
+            _record(9),
+            _record(10),
+        ]
+    )
+    for batch in (first, second):
+        if columnar:
+            batch = Columns(
+                CustomerRecord, [list(c) for c in zip(*batch)], batch.rejected
+            )
+        position.rows += len(batch) + len(batch.rejected)
+        yield batch
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+@pytest.mark.parametrize("columnar", [False, True])
+def test_rejects_carry_their_line(store, monkeypatch, tmp_path, workers, columnar):
+    monkeypatch.setattr(settings, "load_workers", workers)
+    monkeypatch.setattr(settings, "max_rejects", 5)
+    monkeypatch.setattr(settings, "temp_dir", tmp_path)
+    monkeypatch.setattr(load, "_flusher", lambda mode: _flush)
+    monkeypatch.setattr(load, "Session", FakeSession)
+    monkeypatch.setattr(load, "CheckpointStore", lambda session: store)
+    position = Position()
+
+    stats = load.load_batches(
+        "r", _batches(position, columnar), FakeSession(), store, position
+    )
+
+    assert stats.rejected == 2
+    with open(tmp_path / "r.rejects.ndjson") as f:
+        rejects = [json.loads(line) for line in f]
+    assert sorted((r["phase"], r["row"]) for r in rejects) == [
+        ("LOAD", 8),
+        ("TRANSFORM", 3),
+    ]
@@ -0,0 +1,82 @@
+import contextlib
+import json
+
+import psycopg2
+import pytest
+
+from etl import run
+from etl.config.settings import settings
+from etl.phases import load
+from etl.phases.quarantine import RejectBudgetExceeded
+
+
+class TransactionalSession:
+    """Keeps flushed rows pending until ``commit``; ``rollback`` and a
+    failed ``begin_nested`` block drop them."""
+
+    def __init__(self):
+        self.pending = []
+        self.committed = []
+
+    def execute(self, statement, params=None):
+        pass
+
+    def commit(self):
+        self.committed.extend(self.pending)
+        self.pending.clear()
+
+    def rollback(self):
+        self.pending.clear()
+
+    def close(self):
+        pass
+
+    @contextlib.contextmanager
+    def begin_nested(self):
+        mark = len(self.pending)
+        try:
+            yield
+        except Exception:
+            del self.pending[mark:]
+            raise
+
+
+def _flush(rows, session, changed_only=False):
+    rows = list(rows)
+    if any(row.email == "bad" for row in rows):
+        raise psycopg2.DataError("bad email")
+    session.pending.extend(row.external_id for row in rows)
+    return len(rows), 0
+
+
+def test_failed_run_commits_no_rows(store, monkeypatch, tmp_path):
+    path = tmp_path / "customers.ndjson"
+    path.write_text(
+        "".join(
+            json.dumps(
+                {
+                    "id": str(i),
+                    "name": "n",
+                    "email": "bad" if i in (7, 10) else "e",
+                    "updated_at": "2024-01-01",
+                }
+            )
+            + "\n"
+            for i in range(1, 13)
+        )
+    )
+    session = TransactionalSession()
+    monkeypatch.setattr(settings, "chunk_size", 12)
+    monkeypatch.setattr(settings, "max_rejects", 1)
+    monkeypatch.setattr(settings, "temp_dir", tmp_path)
+    monkeypatch.setattr(load, "_flusher", lambda mode: _flush)
+    monkeypatch.setattr(run, "Session", lambda: session)
+    monkeypatch.setattr(run, "CheckpointStore", lambda session: store)
+    monkeypatch.setattr(run, "download", lambda run_id, store: path)
+
+    # the budget runs out halfway through bisecting the chunk
+    with pytest.raises(RejectBudgetExceeded):
+        run.run_etl("r")
+
+    assert session.committed == []
+    assert store.get("r", "LOAD") is None
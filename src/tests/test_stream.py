@@ -0,0 +1,100 @@
+import gzip
+import io
+import zipfile
+
+import pytest
+
+from etl.phases.extract import Position
+from etl.phases.stream import stream_batches
+
+
+class Response:
+    """Just enough of a streamed requests response: ``body`` is served in
+    small chunks under the given headers."""
+
+    def __init__(self, body, headers, status_code=200):
+        self.body = body
+        self.headers = headers
+        self.status_code = status_code
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.body), 7):
+            yield self.body[i : i + 7]
+
+
+class Session:
+    def __init__(self, body, length=None):
+        self.body = body
+        self.length = len(body) if length is None else length
+
+    def get(self, url, headers, stream, timeout):
+        return Response(self.body, {"Content-Length": str(self.length)})
+
+
+def _lines(n, start=0):
+    return b"".join(b'{"n": %d}\n' % i for i in range(start, start + n))
+
+
+def _zip():
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("a.ndjson", _lines(30))
+        zf.writestr("b.ndjson", _lines(30, 30))
+    return out.getvalue()
+
+
+def _stream(session, name="data.zip"):
+    batches = stream_batches("r", f"http://x/{name}", None, Position(), session, 8)
+    return [line for batch in batches for line in batch]
+
+
+def test_zip_is_read_to_its_directory():
+    assert len(_stream(Session(_zip()))) == 60
+
+
+def test_zip_cut_at_an_entry_boundary_fails():
+    data = _zip()
+    second = zipfile.ZipFile(io.BytesIO(data)).getinfo("b.ndjson").header_offset
+
+    # the connection dropped just before the second entry
+    with pytest.raises(EOFError):
+        _stream(Session(data[:second], length=len(data)))
+
+
+def test_zip_with_a_corrupt_header_fails():
+    data = bytearray(_zip())
+    second = zipfile.ZipFile(io.BytesIO(data)).getinfo("b.ndjson").header_offset
+    data[second : second + 4] = b"PK\x07\x07"
+
+    with pytest.raises(ValueError, match="signature"):
+        _stream(Session(bytes(data)))
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_short_body_fails_before_its_partial_line(compress):
+    data = _lines(30)
+    # cut mid-line, or at the end of a gzip member that ends mid-line
+    cut = 155
+    if compress:
+        first = gzip.compress(data[:cut])
+        data, cut = first + gzip.compress(data[cut:]), len(first)
+    received = []
+
+    with pytest.raises(EOFError, match="stopped"):
+        batches = stream_batches(
+            "r", "http://x/data", None, Position(), Session(data[:cut], len(data)), 8
+        )
+        for batch in batches:
+            received.extend(batch)
+
+    assert all(line.endswith(b"}") for line in received)
+    assert len(_stream(Session(data), "data")) == 30
@@ -0,0 +1,55 @@
+import json
+from dataclasses import replace
+
+import pytest
+
+from etl.config.settings import settings
+from etl.phases.extract import Position, extract_batches
+from etl.phases.transform import transform_batches, transform_parallel
+
+
+def _source(path):
+    lines = [
+        json.dumps({"id": f"c{i}", "name": f" n{i} ", "email": "E", "updated_at": None})
+        for i in range(53)
+    ]
+    # one line the mapping rejects, so rows and input lines part ways
+    lines[17] = '{"name": "no id"}'
+    path.write_text("\n".join(lines) + "\n")
+    return path
+
+
+def _records(batch):
+    return [tuple(row) for row in batch]
+
+
+@pytest.mark.parametrize("columnar", [False, True])
+def test_parallel_matches_serial(tmp_path, store, monkeypatch, columnar):
+    monkeypatch.setattr(settings, "max_rejects", 10)
+    monkeypatch.setattr(settings, "transform_task_lines", 10)
+    path = _source(tmp_path / "in.ndjson")
+
+    position = Position()
+    rows, rejected, at = [], [], {}
+    batches = extract_batches("r", path, store, position, batch_lines=4)
+    for batch in transform_batches(batches, columnar=columnar):
+        rows.extend(_records(batch))
+        rejected.extend(line for _, _, line in getattr(batch, "rejected", ()))
+        # what load would checkpoint after this batch, by rows yielded
+        at[len(rows)] = replace(position)
+
+    position, received = Position(), Position()
+    got, got_rejected, seen = [], [], []
+    batches = extract_batches("r", path, store, position, batch_lines=4)
+    for batch in transform_parallel(
+        batches, position, received, workers=2, columnar=columnar
+    ):
+        got.extend(_records(batch))
+        got_rejected.extend(line for _, _, line in getattr(batch, "rejected", ()))
+        assert received == at[len(got)]
+        seen.append(received.rows)
+
+    assert got == rows and len(rows) == 52
+    assert got_rejected == rejected and len(rejected) == 1
+    # tasks of at least ten lines, so fewer batches than the serial path
+    assert seen == [12, 24, 36, 48, 53]